@@ -0,0 +1,6 @@
+"""Бенчмарки Yatube.
+
+Каждый скрипт запускается из корня проекта как модуль, например
+``python -m benchmarks.query_plans --posts 1000000``, и работает с отдельной
+базой SQLite, чтобы не трогать db.sqlite3 разработчика.
+"""
@@ -0,0 +1,199 @@
+"""Главная страница при медленных клиентах: WSGI с пулом потоков против ASGI.
+
+    python -m benchmarks.asgi_concurrency --threads 4 --slow 8 --fast 4 --seconds 10
+
+Оба сервера выполняют Django в пуле из --threads потоков. WSGI-сервер
+отдаёт соединение потоку сразу после accept, как gunicorn с потоковыми
+воркерами, и медленный клиент, который по байту досылает заголовки,
+держит поток всё это время. ASGI-сервер (минимальный HTTP/1.1 на asyncio
+перед yatube.asgi_handler) ждёт заголовки в цикле событий и занимает
+поток только на время работы вьюхи.
+
+--slow клиентов бесконечно шлют запросы, растягивая заголовки на
+--slow-seconds; --fast клиентов запрашивают главную страницу подряд.
+Печатается, сколько ответов в секунду получили быстрые клиенты
+и с какой задержкой.
+"""
+import argparse
+import asyncio
+import http.client
+import multiprocessing
+import os
+import socket
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref import simple_server
+
+from benchmarks.common import report, seed, setup_django
+from benchmarks.load_test import QuietHandler, percentile
+
+
+class PooledWsgiServer(simple_server.WSGIServer):
+    """WSGI-сервер, обслуживающий соединения в пуле из threads потоков."""
+
+    def __init__(self, address, handler, threads):
+        super().__init__(address, handler)
+        self.pool = ThreadPoolExecutor(threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def serve_wsgi(application, threads, ready):
+    server = PooledWsgiServer(("127.0.0.1", 0), QuietHandler, threads)
+    server.set_app(application)
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+async def _handle(application, reader, writer):
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, version = lines[0].split(" ")
+        headers = [tuple(part.strip() for part in line.split(":", 1)) for line in lines[1:] if line]
+        length = int(dict((name.lower(), value) for name, value in headers).get("content-length", 0))
+        body = await reader.readexactly(length) if length else b""
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        writer.close()
+        return
+    path, _, query = target.partition("?")
+    scope = {
+        "type": "http", "method": method, "path": urllib.parse.unquote(path),
+        "query_string": query.encode("latin-1"), "http_version": version.split("/")[1],
+        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        "server": writer.get_extra_info("sockname")[:2], "client": writer.get_extra_info("peername")[:2],
+    }
+    response = {}
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response.update(status=message["status"], headers=message["headers"])
+        else:
+            response.setdefault("body", b"")
+            response["body"] += message.get("body", b"")
+
+    await application(scope, receive, send)
+    lines = [f"HTTP/1.1 {response['status']} -".encode()]
+    lines += [name + b": " + value for name, value in response["headers"]]
+    lines += [b"Content-Length: %d" % len(response["body"]), b"Connection: close"]
+    writer.write(b"\r\n".join(lines) + b"\r\n\r\n" + response["body"])
+    await writer.drain()
+    writer.close()
+
+
+def serve_asgi(application, ready):
+    async def main():
+        server = await asyncio.start_server(
+            lambda reader, writer: _handle(application, reader, writer), "127.0.0.1", 0,
+        )
+        ready.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+    asyncio.run(main())
+
+
+def server_process(kind, db, threads, ready):
+    setup_django(db)
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+    from yatube.asgi_handler import AsgiHandler
+    settings.DEBUG = False
+    if kind == "wsgi":
+        serve_wsgi(get_wsgi_application(), threads, ready)
+    else:
+        serve_asgi(AsgiHandler(get_wsgi_application(), threads), ready)
+
+
+def slow_client(port, seconds, stop):
+    request = b"GET / HTTP/1.1\r\nHost: localhost\r\nX-Padding: " + b"x" * 20 + b"\r\n\r\n"
+    pause = seconds / len(request)
+    while not stop.is_set():
+        try:
+            with socket.create_connection(("127.0.0.1", port)) as connection:
+                for byte in request:
+                    if stop.is_set():
+                        return
+                    connection.sendall(bytes([byte]))
+                    time.sleep(pause)
+                connection.recv(65536)
+        except OSError:
+            # сервер остановлен в конце прогона
+            return
+
+
+def fast_client(port, stop, timings):
+    while not stop.is_set():
+        started = time.perf_counter()
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        try:
+            connection.request("GET", "/", headers={"Host": "localhost"})
+            connection.getresponse().read()
+        except (OSError, http.client.HTTPException):
+            return
+        finally:
+            connection.close()
+        if not stop.is_set():
+            timings.append((time.perf_counter() - started) * 1000)
+
+
+def run(kind, args):
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    server = context.Process(target=server_process, args=(kind, args.db, args.threads, ready), daemon=True)
+    server.start()
+    port = ready.get()
+    stop = threading.Event()
+    timings = []
+    clients = [
+        threading.Thread(target=slow_client, args=(port, args.slow_seconds, stop)) for _ in range(args.slow)
+    ] + [threading.Thread(target=fast_client, args=(port, stop, timings)) for _ in range(args.fast)]
+    for client in clients:
+        client.start()
+    time.sleep(args.seconds)
+    stop.set()
+    server.terminate()
+    for client in clients:
+        client.join()
+    if not timings:
+        print(f"{kind:<6}быстрые клиенты не получили ни одного ответа")
+        return
+    print(
+        f"{kind:<6}{len(timings) / args.seconds:8.1f} отв/с   p50 {percentile(timings, 0.5):8.1f} ms"
+        f"   p95 {percentile(timings, 0.95):8.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "yatube-load.sqlite3"))
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=4, help="потоков Django у каждого сервера")
+    parser.add_argument("--slow", type=int, default=8, help="медленных клиентов")
+    parser.add_argument("--slow-seconds", type=float, default=2, help="за сколько медленный клиент шлёт запрос")
+    parser.add_argument("--fast", type=int, default=4, help="быстрых клиентов")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        setup_django(args.db)
+        seed(users=args.users, posts=args.posts)
+    for kind in ("wsgi", "asgi"):
+        run(kind, args)
+    report(f"database: {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Доля попаданий в кэш при нескольких воркерах.
+
+    python -m benchmarks.cache_hit_rates --workers 4 --requests 20000
+
+Каждый воркер — отдельный процесс, как воркер gunicorn. Воркеры читают
+ключи с распределением Zipf (несколько горячих групп и профилей, длинный
+хвост редких) по схеме read-through: при промахе «идут в базу» и кладут
+значение в кэш. С LocMemCache каждый процесс прогревает свой кэш сам,
+с общим бэкендом промах одного воркера становится попаданием для остальных.
+Для memcached поднимается yatube.cache_server; бэкенд пропускается,
+если не установлен python-memcached.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import report
+
+# бэкенд: (YATUBE_CACHE, алиас кэша)
+BACKENDS = {
+    "locmem": ("locmem", "default"),
+    "file": ("file", "default"),
+    "memcached": ("memcached", "default"),
+    "file + hot": ("file", "hot"),
+    "memcached + hot": ("memcached", "hot"),
+}
+
+
+def zipf_keys(count, keys, exponent, random_seed):
+    rnd = random.Random(random_seed)
+    weights = [1 / rank ** exponent for rank in range(1, keys + 1)]
+    return rnd.choices(range(keys), weights, k=count)
+
+
+def worker(backend, alias, location, keys, barrier, results):
+    os.environ["DJANGO_SETTINGS_MODULE"] = "yatube.settings"
+    os.environ["YATUBE_CACHE"] = backend
+    os.environ["YATUBE_CACHE_LOCATION"] = location
+    import django
+    django.setup()
+    from django.core.cache import caches
+
+    cache = caches[alias]
+    hits = 0
+    barrier.wait()
+    started = time.perf_counter()
+    for key in keys:
+        if cache.get(f"bench:{key}") is None:
+            cache.set(f"bench:{key}", {"id": key, "title": f"Группа {key}"}, 300)
+        else:
+            hits += 1
+    results.put((hits, time.perf_counter() - started))
+
+
+def _run(backend, alias, location, workers, requests, keys, exponent):
+    barrier = multiprocessing.Barrier(workers)
+    queue = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker, args=(
+            backend, alias, location, zipf_keys(requests, keys, exponent, seed), barrier, queue,
+        ))
+        for seed in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    results = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+    hits = sum(hits for hits, _ in results)
+    elapsed = max(elapsed for _, elapsed in results)
+    return hits / (workers * requests), workers * requests / elapsed
+
+
+def _memcached_available():
+    try:
+        import memcache  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _start_cache_server():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen([sys.executable, "-m", "yatube.cache_server", "--port", str(port)])
+    for _ in range(50):
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    return server, f"127.0.0.1:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=20000, help="запросов на воркер")
+    parser.add_argument("--keys", type=int, default=5000)
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--backend", choices=BACKENDS, action="append")
+    args = parser.parse_args()
+
+    server = None
+    print(f"{'backend':<18}{'hit rate':>10}{'ops/s':>12}")
+    try:
+        for name in args.backend or BACKENDS:
+            backend, alias = BACKENDS[name]
+            if backend == "memcached":
+                if not _memcached_available():
+                    report(f"{name}: python-memcached не установлен, пропускаю")
+                    continue
+                # каждый прогон начинается с пустого кэша
+                if server is not None:
+                    server.terminate()
+                server, location = _start_cache_server()
+            elif backend == "file":
+                location = tempfile.mkdtemp(prefix="yatube-cache-")
+            else:
+                location = ""
+            rate, throughput = _run(backend, alias, location, args.workers, args.requests, args.keys, args.zipf)
+            print(f"{name:<18}{rate:>10.1%}{throughput:>12.0f}")
+    finally:
+        if server is not None:
+            server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import contextlib
+import datetime as dt
+import os
+import random
+import sys
+import time
+
+import django
+
+
+def setup_django(db_name):
+    """Настраивает Django на отдельную базу и применяет миграции."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "yatube.settings")
+    from django.conf import settings
+    settings.DATABASES["default"]["NAME"] = db_name
+    django.setup()
+    from django.core.management import call_command
+    call_command("migrate", verbosity=0)
+
+
+@contextlib.contextmanager
+def keep_timestamps(*models):
+    """Отключает auto_now_add, чтобы bulk_create сохранил заданные даты."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, "auto_now_add", False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def report(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def _batched_create(model, rows, batch):
+    buffer = []
+    for row in rows:
+        buffer.append(row)
+        if len(buffer) == batch:
+            model.objects.bulk_create(buffer)
+            buffer = []
+    if buffer:
+        model.objects.bulk_create(buffer)
+
+
+def seed(users=1000, groups=50, posts=100000, comments=None, follows=None, batch=10000, random_seed=42):
+    """Заполняет пустую базу случайными данными заданного объёма.
+
+    Даты постов и комментариев разнесены по времени, как на живом сайте.
+    Сигналы моделей не вызываются (bulk_create), счётчики и ленты подписок
+    пересчитываются в конце.
+    """
+    from django.contrib.auth import get_user_model
+    from django.db import transaction
+    from django.db.models import Max, Min
+    from posts import counters, timeline
+    from posts.models import Comment, Follow, Group, Post
+
+    User = get_user_model()
+    rnd = random.Random(random_seed)
+    comments = posts // 2 if comments is None else comments
+    follows = users * 10 if follows is None else follows
+    now = dt.datetime.now(dt.timezone.utc)
+    started = time.monotonic()
+
+    with transaction.atomic(), keep_timestamps(Post, Comment):
+        _batched_create(User, (
+            User(username=f"user{i}", password="!", date_joined=now) for i in range(users)
+        ), batch)
+        user_ids = list(User.objects.values_list("id", flat=True))
+        _batched_create(Group, (
+            Group(title=f"Группа {i}", slug=f"group-{i}") for i in range(groups)
+        ), batch)
+        group_ids = list(Group.objects.values_list("id", flat=True)) + [None] * groups
+        report(f"users={users} groups={groups}")
+
+        _batched_create(Post, (
+            Post(
+                text=f"Пост номер {i} " + " ".join(rnd.choice(WORDS) for _ in range(12)),
+                author_id=rnd.choice(user_ids),
+                group_id=rnd.choice(group_ids),
+                pub_date=now - dt.timedelta(seconds=(posts - i) * 30),
+            )
+            for i in range(posts)
+        ), batch)
+        bounds = Post.objects.aggregate(first=Min("id"), last=Max("id"))
+        first_post, last_post = bounds["first"], bounds["last"]
+        report(f"posts={posts}")
+
+        _batched_create(Comment, (
+            Comment(
+                post_id=rnd.randint(first_post, last_post),
+                author_id=rnd.choice(user_ids),
+                text=" ".join(rnd.choice(WORDS) for _ in range(6)),
+                created=now - dt.timedelta(seconds=(comments - i) * 60),
+            )
+            for i in range(comments)
+        ), batch)
+        report(f"comments={comments}")
+
+        pairs = set()
+        while len(pairs) < min(follows, users * (users - 1)):
+            user, author = rnd.choice(user_ids), rnd.choice(user_ids)
+            if user != author:
+                pairs.add((user, author))
+        _batched_create(Follow, (Follow(user_id=u, author_id=a) for u, a in pairs), batch)
+        report(f"follows={len(pairs)}")
+        counters.reconcile()
+        for user_id in {user for user, _ in pairs}:
+            timeline.rebuild(user_id)
+        report("counters and timelines rebuilt")
+    report(f"seeded in {time.monotonic() - started:.1f}s")
+
+
+WORDS = (
+    "кот", "город", "утро", "дорога", "книга", "море", "снег", "музыка", "дом",
+    "весна", "кофе", "поезд", "лес", "письмо", "окно", "друг", "python", "django",
+)
@@ -0,0 +1,128 @@
+"""Раздача картинок и статики: django.views.static.serve против FilesMiddleware.
+
+    python -m benchmarks.file_serving --requests 300
+
+Оба варианта работают под wsgiref в одном процессе с боевым списком
+middleware. Старый путь — URLconf с django.views.static.serve, как в
+yatube/urls.py при DEBUG; новый — yatube.serving.FilesMiddleware,
+а для картинок ещё и X-Accel-Redirect, когда файл отдаёт nginx.
+Картинка — posts/test_files/file.jpg, статика — CSS размером
+с bootstrap.min.css, собранный CompressedManifestStaticFilesStorage.
+Печатаются ответы в секунду и байты, ушедшие клиенту, на ответ.
+"""
+import argparse
+import http.client
+import os
+import shutil
+import tempfile
+import threading
+import time
+from wsgiref import simple_server
+
+import django
+
+from benchmarks.load_test import QuietHandler, percentile
+
+SAMPLE = os.path.join(os.path.dirname(__file__), os.pardir, "posts", "test_files", "file.jpg")
+IMAGE = "posts/ab/" + "ab" * 32 + ".jpg"
+
+urlpatterns = []
+
+
+def prepare(root):
+    """Каталоги статики и медиа во временном root, как после collectstatic."""
+    from django.conf import settings
+    from django.core.management import call_command
+
+    source = os.path.join(root, "source")
+    os.makedirs(os.path.join(source, "css"))
+    rules = "".join(f".rule-{i} {{ margin: {i % 40}px; padding: {i % 7}px; }}\n" for i in range(4000))
+    with open(os.path.join(source, "css", "site.css"), "w") as stream:
+        stream.write(rules)
+    settings.STATICFILES_DIRS = [source]
+    settings.STATIC_ROOT = os.path.join(root, "static")
+    settings.MEDIA_ROOT = os.path.join(root, "media")
+    settings.STATICFILES_STORAGE = "yatube.staticfiles.CompressedManifestStaticFilesStorage"
+    os.makedirs(os.path.dirname(os.path.join(settings.MEDIA_ROOT, IMAGE)))
+    shutil.copyfile(SAMPLE, os.path.join(settings.MEDIA_ROOT, IMAGE))
+    call_command("collectstatic", interactive=False, verbosity=0)
+
+
+def server(middleware):
+    from django.conf import settings
+    from django.core.handlers.wsgi import WSGIHandler
+
+    settings.MIDDLEWARE = middleware
+    httpd = simple_server.make_server("127.0.0.1", 0, WSGIHandler(), handler_class=QuietHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd.server_address[1]
+
+
+def measure(port, path, headers, requests):
+    timings, sent = [], 0
+    for _ in range(requests):
+        started = time.perf_counter()
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        connection.request("GET", path, headers={"Host": "localhost", **headers})
+        response = connection.getresponse()
+        body = response.read()
+        connection.close()
+        timings.append((time.perf_counter() - started) * 1000)
+        if response.status >= 400:
+            raise SystemExit(f"{path}: ответ {response.status}")
+        sent = len(body)
+    return timings, sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "yatube.settings")
+    django.setup()
+    from django.conf import settings
+    from django.contrib.staticfiles.storage import staticfiles_storage
+    from django.urls import re_path
+    from django.views.static import serve
+
+    settings.DEBUG = False
+    root = tempfile.mkdtemp()
+    try:
+        prepare(root)
+        css = staticfiles_storage.url("css/site.css")
+        settings.ROOT_URLCONF = __name__
+        urlpatterns.extend([
+            re_path(r"^media/(?P<path>.*)$", serve, {"document_root": settings.MEDIA_ROOT}),
+            re_path(r"^static/(?P<path>.*)$", serve, {"document_root": settings.STATIC_ROOT}),
+        ])
+        middleware = [name for name in settings.MIDDLEWARE if not name.startswith("debug_toolbar.")]
+        ports = {
+            "static.serve": server(middleware),
+            "FilesMiddleware": server(["yatube.serving.FilesMiddleware"] + middleware),
+        }
+        scenarios = [
+            ("картинка", f"/media/{IMAGE}", {}),
+            ("Range 64 КБ", f"/media/{IMAGE}", {"Range": "bytes=0-65535"}),
+            ("CSS, gzip", css, {"Accept-Encoding": "gzip"}),
+            ("повторный CSS", css, {"If-Modified-Since": "Sun, 01 Jan 2040 00:00:00 GMT"}),
+        ]
+        for scenario, path, headers in scenarios:
+            for name, port in ports.items():
+                timings, sent = measure(port, path, headers, args.requests)
+                print(
+                    f"{scenario:<15}{name:<17}{1000 / (sum(timings) / len(timings)):8.0f} отв/с"
+                    f"   p95 {percentile(timings, 0.95):6.2f} ms   {sent / 1024:8.1f} КБ"
+                )
+        settings.MEDIA_SENDFILE = "x-accel-redirect"
+        timings, sent = measure(ports["FilesMiddleware"], f"/media/{IMAGE}", {}, args.requests)
+        print(
+            f"{'картинка':<15}{'X-Accel':<17}{1000 / (sum(timings) / len(timings)):8.0f} отв/с"
+            f"   p95 {percentile(timings, 0.95):6.2f} ms   {sent / 1024:8.1f} КБ"
+        )
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Скорость обработки картинок постов при загрузке (posts/images.py).
+
+    python -m benchmarks.image_ingest --repeat 5
+
+Пачка собирается из posts/test_files/file.jpg: сам снимок, он же
+в размере 12-мегапиксельной камеры с EXIF, PNG-скриншот и PNG
+с прозрачностью. Каждая картинка проходит images.ingest() repeat раз
+для JPEG и WebP. Печатается, сколько картинок в секунду и мегапикселей
+в секунду обрабатывается и во сколько раз уменьшается объём.
+"""
+import argparse
+import io
+import os
+import time
+
+import django
+
+SAMPLE = os.path.join(os.path.dirname(__file__), os.pardir, "posts", "test_files", "file.jpg")
+
+
+def samples():
+    """(имя, байты) тестовой пачки."""
+    from PIL import Image
+
+    with open(SAMPLE, "rb") as stream:
+        original = stream.read()
+    photo = Image.open(io.BytesIO(original)).convert("RGB")
+    batch = [("file.jpg", original)]
+
+    camera = photo.resize((3024, 4032), Image.BICUBIC)
+    exif = Image.Exif()
+    exif[0x010F] = "Camera"
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    camera.save(buffer, "JPEG", quality=95, exif=exif)
+    batch.append(("camera.jpg", buffer.getvalue()))
+
+    buffer = io.BytesIO()
+    photo.resize((2560, 1440)).save(buffer, "PNG")
+    batch.append(("screenshot.png", buffer.getvalue()))
+
+    buffer = io.BytesIO()
+    photo.resize((800, 600)).convert("RGBA").save(buffer, "PNG")
+    batch.append(("logo.png", buffer.getvalue()))
+    return batch
+
+
+def run(batch, image_format, repeat):
+    from django.conf import settings
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from PIL import Image
+    from posts import images
+
+    settings.POST_IMAGE_FORMAT = image_format
+    pixels = size_in = size_out = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for name, data in batch:
+            result = images.ingest(SimpleUploadedFile(name, data))
+            width, height = Image.open(io.BytesIO(data)).size
+            pixels += width * height
+            size_in += len(data)
+            size_out += result.size
+            result.close()
+    elapsed = time.perf_counter() - started
+    count = repeat * len(batch)
+    print(
+        f"{image_format:<6}{count / elapsed:8.1f} карт/с  {pixels / elapsed / 10 ** 6:8.1f} Мпикс/с"
+        f"  {size_in / 2 ** 20:7.1f} МБ -> {size_out / 2 ** 20:5.1f} МБ ({size_in / size_out:.1f}x)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "yatube.settings")
+    django.setup()
+    batch = samples()
+    for image_format in ("JPEG", "WEBP"):
+        run(batch, image_format, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""Нагрузочный прогон страниц приложения posts с проверкой на регрессии.
+
+    python -m benchmarks.load_test --posts 100000 --requests 200
+    python -m benchmarks.load_test --mode wsgi --concurrency 4
+    python -m benchmarks.load_test --save-baseline
+
+Засевает отдельную базу (если она пустая) и запрашивает каждый адрес
+из posts/urls.py: тестовым клиентом Django (--mode client) или по HTTP
+у локального WSGI-сервера (--mode wsgi). Для каждого адреса печатает
+p50/p95/p99 времени ответа, число запросов к базе и пик памяти на запрос
+(в режиме wsgi — RSS процесса). Запросы к базе и память считаются
+отдельным проходом, чтобы трассировка не искажала время.
+
+Результат сравнивается с сохранённой базовой линией (benchmarks/baseline.json):
+регрессия — больше запросов к базе, чем в базовой линии, или p95 и память
+больше на --tolerance и хотя бы на 2 мс/100 КБ. При регрессии
+код выхода 1. Время базовой линии масштабируется по калибровочной
+нагрузке, которую прогон меряет в начале и в конце: так общий фон машины
+не выдаётся за регрессию. Время сравнимо только на том же объёме данных
+и похожей машине, число запросов — везде.
+"""
+import argparse
+import concurrent.futures
+import http.client
+import json
+import os
+import resource
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.parse
+from wsgiref import simple_server
+
+from benchmarks.common import report, seed, setup_django
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+HOST = "localhost"
+
+
+class Scenario:
+    """Один запрос к адресу url_name: кто его делает и с какими данными."""
+
+    def __init__(self, url_name, path, user=None, data=None):
+        self.name = url_name
+        self.path = path
+        self.user = user
+        self.data = data
+
+
+def scenarios():
+    """Сценарий на каждый адрес posts/urls.py; без сценария прогон не начнётся."""
+    from django.contrib.auth import get_user_model
+    from django.urls import reverse
+    from posts import urls
+    from posts.models import Follow, Group, Post
+
+    User = get_user_model()
+    follow = Follow.objects.order_by("pk").first()
+    reader, author = User.objects.get(pk=follow.user_id), User.objects.get(pk=follow.author_id)
+    post = Post.objects.filter(author=author).order_by("-pub_date").first()
+    # комментарии пишутся к другому посту: страница post от прогона к прогону не тяжелеет
+    commented = Post.objects.filter(author=author).order_by("pub_date").first()
+    group = Group.objects.order_by("pk").first()
+    other = User.objects.exclude(pk__in=[reader.pk, author.pk]).order_by("pk").first()
+    on_post = {"username": author.username, "post_id": post.pk}
+
+    result = [
+        Scenario("index", reverse("index")),
+        Scenario("group", reverse("group", args=[group.slug])),
+        Scenario("new_post", reverse("new_post"), user=author),
+        Scenario("search", reverse("search") + "?q=" + urllib.parse.quote("кот море")),
+        Scenario("follow_index", reverse("follow_index"), user=reader),
+        Scenario("profile", reverse("profile", args=[author.username])),
+        Scenario("post", reverse("post", kwargs=on_post)),
+        Scenario("post_edit", reverse("post_edit", kwargs=on_post), user=author),
+        Scenario(
+            "add_comment", reverse("add_comment", args=[author.username, commented.pk]),
+            user=reader, data={"text": "нагрузка"},
+        ),
+        Scenario("post_comments", reverse("post_comments", kwargs=on_post)),
+        # подписка и отписка на другого автора, чтобы не трогать ленту reader
+        Scenario("profile_follow", reverse("profile_follow", args=[other.username]), user=reader),
+        Scenario("profile_unfollow", reverse("profile_unfollow", args=[other.username]), user=reader),
+    ]
+    missing = {pattern.name for pattern in urls.urlpatterns} - {scenario.name for scenario in result}
+    if missing:
+        raise SystemExit(f"нет сценария для адресов: {', '.join(sorted(missing))}")
+    return result
+
+
+def calibrate():
+    """Время (мс) фиксированной нагрузки на Python и шаблоны: лучшее из пяти."""
+    from django.template import Context, Template
+    template = Template("{% for item in items %}<li>{{ item.name|title }}</li>{% endfor %}")
+    context = Context({"items": [{"name": f"item {i}"} for i in range(2000)]})
+    best = None
+    for _ in range(5):
+        started = time.perf_counter()
+        template.render(context)
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def percentile(values, share):
+    """Значение, ниже которого лежит доля share замеров (метод ближайшего ранга)."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(share * len(ordered)) - 1))]
+
+
+def summarize(timings, queries, memory):
+    return {
+        "p50": round(percentile(timings, 0.50), 2),
+        "p95": round(percentile(timings, 0.95), 2),
+        "p99": round(percentile(timings, 0.99), 2),
+        "queries": queries,
+        "memory_kb": memory,
+    }
+
+
+class ClientRunner:
+    """Запросы тестовым клиентом Django в этом же процессе."""
+
+    def __init__(self):
+        from django.test import Client
+        self.clients = {}
+        self.make = lambda: Client(HTTP_HOST=HOST)
+
+    def client(self, user):
+        if user not in self.clients:
+            self.clients[user] = self.make()
+            if user is not None:
+                self.clients[user].force_login(user)
+        return self.clients[user]
+
+    def request(self, scenario):
+        client = self.client(scenario.user)
+        if scenario.data is None:
+            response = client.get(scenario.path)
+        else:
+            response = client.post(scenario.path, scenario.data)
+        if response.status_code >= 400:
+            raise SystemExit(f"{scenario.name}: ответ {response.status_code}")
+
+    def measure(self, scenario):
+        """Запросы к базе и пик выделенной памяти одного запроса."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as captured:
+                self.request(scenario)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return len(captured), peak // 1024
+
+    def run(self, scenario, count, concurrency):
+        timings = []
+        for _ in range(count):
+            started = time.perf_counter()
+            self.request(scenario)
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def close(self):
+        pass
+
+
+class QuietHandler(simple_server.WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(socketserver.ThreadingMixIn, simple_server.WSGIServer):
+    daemon_threads = True
+
+
+class WsgiRunner:
+    """Запросы по HTTP к yatube.wsgi, поднятому в фоновом потоке."""
+
+    def __init__(self):
+        from django.utils.crypto import get_random_string
+        from yatube.wsgi import application
+        self.server = simple_server.make_server(
+            "127.0.0.1", 0, application, server_class=ThreadingServer, handler_class=QuietHandler,
+        )
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.local = threading.local()
+        self.users = {}
+        # одинаковый токен в cookie и в форме проходит проверку CSRF
+        self.csrf = get_random_string(64)
+
+    def cookies(self, user):
+        if user not in self.users:
+            from django.test import Client
+            cookies = {"csrftoken": self.csrf}
+            if user is not None:
+                client = Client()
+                client.force_login(user)
+                cookies.update({name: morsel.value for name, morsel in client.cookies.items()})
+            self.users[user] = "; ".join(f"{name}={value}" for name, value in cookies.items())
+        return self.users[user]
+
+    def request(self, scenario):
+        if not hasattr(self.local, "connection"):
+            self.local.connection = http.client.HTTPConnection("127.0.0.1", self.port)
+        headers = {"Host": HOST, "Cookie": self.cookies(scenario.user)}
+        body = None
+        if scenario.data is not None:
+            body = urllib.parse.urlencode({**scenario.data, "csrfmiddlewaretoken": self.csrf})
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        self.local.connection.request("POST" if body else "GET", scenario.path, body, headers)
+        response = self.local.connection.getresponse()
+        response.read()
+        if response.status >= 400:
+            raise SystemExit(f"{scenario.name}: ответ {response.status}")
+
+    def measure(self, scenario):
+        # запросы выполняет поток сервера: считаются только память процесса
+        self.request(scenario)
+        return None, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def timed(self, scenario):
+        started = time.perf_counter()
+        self.request(scenario)
+        return (time.perf_counter() - started) * 1000
+
+    def run(self, scenario, count, concurrency):
+        with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+            return list(pool.map(lambda _: self.timed(scenario), range(count)))
+
+    def close(self):
+        self.server.shutdown()
+
+
+def compare(results, baseline, tolerance, speed=1.0):
+    """Строки с описанием регрессий относительно baseline.
+
+    speed — во сколько раз машина сейчас медленнее, чем при записи baseline.
+    """
+    problems = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if current["queries"] is not None and before["queries"] is not None and current["queries"] > before["queries"]:
+            problems.append(f"{name}: запросов к базе {current['queries']}, было {before['queries']}")
+        expected = round(before["p95"] * speed, 2)
+        if current["p95"] > expected * (1 + tolerance) and current["p95"] - expected > 2:
+            problems.append(f"{name}: p95 {current['p95']} ms, ожидалось {expected} ms")
+        if current["memory_kb"] > before["memory_kb"] * (1 + tolerance) and current["memory_kb"] - before["memory_kb"] > 100:
+            problems.append(f"{name}: память {current['memory_kb']} KB, было {before['memory_kb']} KB")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "yatube-load.sqlite3"))
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--comments", type=int, help="по умолчанию половина числа постов")
+    parser.add_argument("--follows", type=int, help="по умолчанию десять на пользователя")
+    parser.add_argument("--mode", choices=["client", "wsgi"], default="client")
+    parser.add_argument("--requests", type=int, default=200, help="замеров на адрес")
+    parser.add_argument("--warmup", type=int, default=10, help="запросов перед замерами")
+    parser.add_argument("--concurrency", type=int, default=1, help="параллельных клиентов в режиме wsgi")
+    parser.add_argument("--only", action="append", help="только эти адреса (имена из posts/urls.py)")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="записать результат как базовую линию")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="допустимый рост p95 и памяти")
+    args = parser.parse_args()
+
+    setup_django(args.db)
+    from django.conf import settings
+    from posts.models import Post
+    # без панели отладки и записи запросов, как на боевом сервере
+    settings.DEBUG = False
+    if not Post.objects.exists():
+        seed(
+            users=args.users, groups=args.groups, posts=args.posts,
+            comments=args.comments, follows=args.follows,
+        )
+
+    runner = WsgiRunner() if args.mode == "wsgi" else ClientRunner()
+    results = {}
+    calibration = calibrate()
+    try:
+        for scenario in scenarios():
+            if args.only and scenario.name not in args.only:
+                continue
+            for _ in range(args.warmup):
+                runner.request(scenario)
+            timings = runner.run(scenario, args.requests, args.concurrency)
+            queries, memory = runner.measure(scenario)
+            results[scenario.name] = summary = summarize(timings, queries, memory)
+            print(
+                f"{scenario.name:<18}p50 {summary['p50']:8.2f} ms  p95 {summary['p95']:8.2f} ms  "
+                f"p99 {summary['p99']:8.2f} ms  queries {queries if queries is not None else '-':>3}  "
+                f"memory {memory:>7} KB"
+            )
+    finally:
+        runner.close()
+    calibration = min(calibration, calibrate())
+    report(f"калибровка: {calibration:.2f} ms")
+
+    key = f"{args.mode} x{args.concurrency}"
+    stored = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as stream:
+            stored = json.load(stream)
+    if args.save_baseline:
+        stored[key] = {"posts": Post.objects.count(), "calibration": round(calibration, 2), "results": results}
+        with open(args.baseline, "w", encoding="utf-8") as stream:
+            json.dump(stored, stream, indent=2, sort_keys=True)
+            stream.write("\n")
+        report(f"базовая линия сохранена: {args.baseline} [{key}]")
+        return
+    if key not in stored:
+        report(f"нет базовой линии [{key}] в {args.baseline}: сравнивать не с чем")
+        return
+    speed = calibration / stored[key]["calibration"]
+    report(f"машина медленнее базовой линии в {speed:.2f} раза")
+    problems = compare(results, stored[key]["results"], args.tolerance, speed)
+    for problem in problems:
+        report(f"РЕГРЕССИЯ {problem}")
+    if problems:
+        sys.exit(1)
+    report("регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Планы запросов лент на большой базе.
+
+    python -m benchmarks.query_plans --posts 1000000
+
+Засевает отдельную базу (если она пустая), затем для каждой страницы
+печатает EXPLAIN QUERY PLAN её основного запроса и время выполнения.
+В планах не должно быть полного SCAN таблиц постов и комментариев
+и временных B-деревьев для ORDER BY.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.common import report, seed, setup_django
+
+
+def view_queries():
+    from django.contrib.auth import get_user_model
+    from posts import timeline
+    from posts.models import Comment, Follow, Group, Post
+    from posts.pagination import CursorPaginator
+
+    User = get_user_model()
+    author = User.objects.order_by("?").first()
+    reader = Follow.objects.values_list("user_id", flat=True).first()
+    group = Group.objects.first()
+    post = Post.objects.filter(author=author).order_by("-pub_date").first()
+    middle = Post.objects.order_by("-pub_date", "-id")[Post.objects.count() // 2]
+    cursor = CursorPaginator(Post.objects.all(), 10)
+
+    return [
+        ("index", Post.objects.for_feed()[:10]),
+        ("index (cursor)", Post.objects.for_feed().filter(cursor.keyset_filter([middle.pub_date, middle.id], True))[:10]),
+        ("group_posts", Post.objects.filter(group=group).for_feed()[:12]),
+        ("profile", Post.objects.filter(author=author).for_feed()[:5]),
+        ("profile follow check", Follow.objects.filter(user_id=reader, author=author)),
+        ("post_view comments", Comment.objects.filter(post=post).order_by("created", "id")[:20]),
+        ("follow_index", timeline.follow_feed(User(pk=reader))[:10]),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "yatube-bench.sqlite3"))
+    parser.add_argument("--posts", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=10000)
+    args = parser.parse_args()
+
+    setup_django(args.db)
+    from posts.models import Post
+    if not Post.objects.exists():
+        seed(users=args.users, posts=args.posts)
+
+    for name, queryset in view_queries():
+        started = time.perf_counter()
+        list(queryset)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"== {name}: {elapsed:.2f} ms")
+        print(queryset.explain())
+        print()
+    report(f"database: {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Скорость поиска на большой базе.
+
+    python -m benchmarks.search_engines --posts 1000000
+
+Засевает отдельную базу (если она пустая), строит поисковые индексы
+и для нескольких запросов — частого слова, пары частых слов и редкого
+слова — печатает время первой и следующей страницы выдачи у FTS5,
+у обратного индекса SearchTerm и у LIKE '%слово%', который делает админка.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.common import report, seed, setup_django
+
+# частое слово, пара частых, три частых; редкое слово добавляется в main()
+QUERIES = ["кот", "кот море", "поезд письмо django"]
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "yatube-bench.sqlite3"))
+    parser.add_argument("--posts", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--engine", choices=["fts5", "inverted"], action="append")
+    parser.add_argument("--rebuild", action="store_true", help="перестроить индексы, даже если они уже есть")
+    args = parser.parse_args()
+
+    setup_django(args.db)
+    from django.conf import settings
+    from posts import search
+    from posts.models import Post, SearchTerm
+
+    if not Post.objects.exists():
+        seed(users=args.users, posts=args.posts)
+
+    # номер поста из середины базы встречается в одном посте
+    queries = QUERIES + [f"номер {Post.objects.count() // 2}"]
+    for name in args.engine or ["fts5", "inverted"]:
+        settings.SEARCH_BACKEND = name
+        engine = search.engine()
+        if name == "fts5" and not search.FtsEngine.available():
+            report(f"{name}: движок недоступен в этой базе, пропускаю")
+            continue
+        empty = not SearchTerm.objects.exists() if name == "inverted" else not search.search("кот").object_list
+        if empty or args.rebuild:
+            _, elapsed = timed(engine.rebuild)
+            report(f"{name}: индекс построен за {elapsed / 1000:.1f}s")
+        for query in queries:
+            page, first = timed(lambda: search.search(query))
+            cursor = page.next_cursor
+            _, second = timed(lambda: search.search(query, cursor)) if cursor else (None, 0)
+            print(f"{name:<10}{query!r:<26} first {first:9.2f} ms   next {second:9.2f} ms   found {len(page)}")
+
+    for query in queries:
+        words = query.split()
+        queryset = Post.objects.all()
+        for word in words:
+            queryset = queryset.filter(text__icontains=word)
+        _, elapsed = timed(lambda: list(queryset.order_by("-pub_date")[:10]))
+        print(f"{'like':<10}{query!r:<26} first {elapsed:9.2f} ms")
+    report(f"database: {args.db}")
+
+
+if __name__ == "__main__":
+    main()
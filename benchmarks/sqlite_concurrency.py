@@ -0,0 +1,111 @@
+"""Пропускная способность SQLite при одновременных чтении и записи.
+
+    python -m benchmarks.sqlite_concurrency --readers 4 --writers 2 --seconds 10
+
+Засевает базу, копирует её для каждого профиля и запускает процессы-
+читатели (главная страница: count и первые 10 постов ленты) и процессы-
+писатели (комментарий в atomic(), как add_comment). Печатает число
+операций в секунду и ошибок «database is locked» для настроек разработки
+(yatube.settings: журнал DELETE, без busy timeout сверх стандартных 5 с)
+и для боевых (yatube.settings_production: WAL, synchronous=NORMAL, mmap,
+BEGIN IMMEDIATE, постоянные соединения).
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.common import report, seed, setup_django
+
+PROFILES = {
+    "development": "yatube.settings",
+    "production": "yatube.settings_production",
+}
+
+
+def _setup(profile, db):
+    os.environ["DJANGO_SETTINGS_MODULE"] = PROFILES[profile]
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ["YATUBE_SQLITE_PATH"] = db
+    # кэш процесса: бенчмарк меряет базу, а не общий кэш
+    os.environ["YATUBE_CACHE"] = "locmem"
+    os.environ["JOBS_BACKEND"] = "immediate"
+    setup_django(db)
+
+
+def worker(profile, db, role, seconds, results):
+    _setup(profile, db)
+    from django.db import OperationalError, transaction
+    from posts.models import Comment, Post, User
+
+    rnd = random.Random(os.getpid())
+    last = Post.objects.order_by("-pk").values_list("pk", flat=True).first()
+    user_id = User.objects.order_by("pk").values_list("pk", flat=True).first()
+    done = errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            if role == "reader":
+                Post.objects.count()
+                list(Post.objects.for_feed()[:10])
+            else:
+                with transaction.atomic():
+                    Comment.objects.create(post_id=rnd.randint(1, last), author_id=user_id, text="нагрузка")
+            done += 1
+        except OperationalError:
+            errors += 1
+    results.put((role, done, errors))
+
+
+def run(profile, db, readers, writers, seconds):
+    # spawn, а не fork: в дочернем процессе Django настраивается заново
+    # с настройками профиля
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(profile, db, role, seconds, results))
+        for role in ["reader"] * readers + ["writer"] * writers
+    ]
+    for process in processes:
+        process.start()
+    totals = {"reader": [0, 0], "writer": [0, 0]}
+    for _ in processes:
+        role, done, errors = results.get()
+        totals[role][0] += done
+        totals[role][1] += errors
+    for process in processes:
+        process.join()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "yatube-concurrency.sqlite3"))
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        # засевается с настройками разработки: в файле остаётся журнал DELETE
+        setup_django(args.db)
+        seed(users=args.users, posts=args.posts)
+    for profile in PROFILES:
+        copy = f"{args.db}.{profile}"
+        shutil.copyfile(args.db, copy)
+        totals = run(profile, copy, args.readers, args.writers, args.seconds)
+        for role, (done, errors) in totals.items():
+            print(f"{profile:<12}{role:<8}{done / args.seconds:10.1f} оп/с   ошибок {errors}")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(copy + suffix):
+                os.remove(copy + suffix)
+    report(f"database: {args.db}")
+
+
+if __name__ == "__main__":
+    main()
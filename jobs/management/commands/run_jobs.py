@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from jobs.tasks import run_pending
+
+
+class Command(BaseCommand):
+    help = "Воркер очереди задач: выполняет задачи из таблицы Job"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="выполнить готовые задачи и выйти")
+        parser.add_argument("--sleep", type=float, default=1.0, help="пауза, когда очередь пуста, в секундах")
+
+    def handle(self, *args, **options):
+        while True:
+            done = run_pending()
+            close_old_connections()
+            if options["once"]:
+                self.stdout.write(self.style.SUCCESS(f"Выполнено задач: {done}"))
+                return
+            if not done:
+                time.sleep(options["sleep"])
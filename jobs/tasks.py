@@ -0,0 +1,148 @@
+"""Очередь фоновых задач для побочных эффектов записи.
+
+Задача — обычная функция, помеченная декоратором @task; вызов
+``func.delay(*args)`` ставит её в очередь. Аргументы должны сериализоваться
+в JSON, поэтому в задачи передаются id, а не объекты моделей.
+
+Бэкенд выбирается настройкой JOBS_BACKEND:
+
+* ``immediate`` — задача выполняется сразу в вызывающем потоке (разработка
+  и тесты, поведение как без очереди);
+* ``thread`` — после коммита задача уходит фоновому потоку того же процесса;
+* ``database`` — задача записывается в таблицу Job в той же транзакции,
+  что и изменение, и выполняется командой ``python manage.py run_jobs``.
+"""
+import datetime as dt
+import json
+import logging
+import queue
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def task(func=None, *, retries=3):
+    """Регистрирует функцию как задачу с retries попытками выполнения."""
+    def register(func):
+        name = f"{func.__module__}.{func.__name__}"
+        func.task_name = name
+        func.max_attempts = retries
+        func.delay = lambda *args: enqueue(name, *args)
+        registry[name] = func
+        return func
+    return register(func) if func is not None else register
+
+
+def backoff(attempt):
+    """Пауза перед повтором: 10 с, 40 с, 90 с..."""
+    return dt.timedelta(seconds=settings.JOBS_RETRY_DELAY * attempt ** 2)
+
+
+def enqueue(name, *args):
+    func = registry[name]
+    args = json.loads(json.dumps(args))
+    backend = settings.JOBS_BACKEND
+    if backend == "immediate":
+        func(*args)
+    elif backend == "thread":
+        transaction.on_commit(lambda: _thread_queue().put((name, args)))
+    elif backend == "database":
+        Job.objects.create(name=name, args=json.dumps(args), max_attempts=func.max_attempts)
+    else:
+        raise ValueError(f"Неизвестный JOBS_BACKEND: {backend}")
+
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _thread_queue():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_work, name="jobs", daemon=True)
+            _worker.start()
+    return _queue
+
+
+def _work():
+    while True:
+        name, args = _queue.get()
+        func = registry[name]
+        for attempt in range(1, func.max_attempts + 1):
+            close_old_connections()
+            try:
+                func(*args)
+                break
+            except Exception:
+                logger.exception("Задача %s%s, попытка %s", name, args, attempt)
+                if attempt < func.max_attempts:
+                    time.sleep(backoff(attempt).total_seconds())
+            finally:
+                close_old_connections()
+        _queue.task_done()
+
+
+def _claim():
+    """Забирает следующую задачу; несколько воркеров не возьмут одну и ту же."""
+    now = timezone.now()
+    stale = now - dt.timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+    # воркер, взявший задачу, мог упасть: такие задачи возвращаются в очередь
+    Job.objects.filter(status=Job.RUNNING, locked_at__lt=stale).update(status=Job.QUEUED)
+    candidates = (
+        Job.objects.filter(status=Job.QUEUED, run_at__lte=now)
+        .order_by("run_at", "pk").values_list("pk", flat=True)[:10]
+    )
+    for pk in candidates:
+        claimed = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_at=now, attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def run_job(job):
+    """Выполняет взятую задачу и записывает результат или планирует повтор."""
+    func = registry.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f"Задача {job.name} не зарегистрирована")
+        func(*json.loads(job.args))
+    except Exception:
+        logger.exception("Задача %s, попытка %s", job, job.attempts)
+        job.last_error = traceback.format_exc()
+        if func is not None and job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + backoff(job.attempts)
+        else:
+            job.status = Job.FAILED
+    else:
+        job.status = Job.DONE
+    job.locked_at = None
+    job.save(update_fields=["status", "run_at", "locked_at", "last_error"])
+    return job.status == Job.DONE
+
+
+def run_pending(limit=None):
+    """Выполняет готовые к запуску задачи из таблицы. Возвращает их число."""
+    done = 0
+    while limit is None or done < limit:
+        job = _claim()
+        if job is None:
+            break
+        run_job(job)
+        done += 1
+    return done
@@ -0,0 +1,63 @@
+import datetime as dt
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .tasks import registry, run_pending, task
+
+calls = []
+
+
+@task(retries=2)
+def remember(value):
+    if value == "fail":
+        raise RuntimeError("сбой")
+    calls.append(value)
+
+
+@override_settings(JOBS_BACKEND="database")
+class DatabaseQueueTest(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_job_runs_in_worker(self):
+        remember.delay("ok")
+        self.assertEqual(calls, [])
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, ["ok"])
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+
+    def test_failed_job_is_retried_then_given_up(self):
+        remember.delay("fail")
+        run_pending()
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn("RuntimeError", job.last_error)
+        # повтор откладывается, пока не пройдёт пауза
+        self.assertEqual(run_pending(), 0)
+        Job.objects.update(run_at=timezone.now())
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_stale_running_job_is_requeued(self):
+        remember.delay("ok")
+        Job.objects.update(status=Job.RUNNING, locked_at=timezone.now() - dt.timedelta(hours=1))
+        run_pending()
+        self.assertEqual(calls, ["ok"])
+
+    def test_unknown_task_fails(self):
+        Job.objects.create(name="missing.task")
+        run_pending()
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+
+
+class ImmediateQueueTest(TestCase):
+
+    def test_runs_in_place(self):
+        remember.delay("now")
+        self.assertIn("now", calls)
+        self.assertFalse(Job.objects.exists())
+        self.assertIn("jobs.tests.remember", registry)
@@ -0,0 +1,175 @@
+"""JSON API для чтения лент.
+
+Ленты берут те же QuerySet, что и HTML-страницы, и листаются курсором.
+Ответ на условный запрос считается до загрузки постов: сначала выбираются
+только id и время изменения постов страницы, по ним строятся ETag
+и Last-Modified, и если клиент прислал совпадающий If-None-Match,
+он получает 304 без загрузки и сериализации постов. Имена авторов
+и slug групп в ответе меняются без Post.updated, поэтому в ETag входят
+и номера поколений из posts/caching.py, как у HTML-страниц.
+"""
+import calendar
+import datetime
+import hashlib
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_GET
+
+from . import caching, timeline
+from .models import Follow, Group, Post, User
+from .pagination import CursorPaginator
+
+PER_PAGE = 20
+COMMENTS_PER_PAGE = 20
+
+
+def serialize_post(post):
+    return {
+        "id": post.pk,
+        "author": post.author.username,
+        "group": post.group.slug if post.group_id else None,
+        "text": post.text,
+        "pub_date": post.pub_date.isoformat(),
+        "updated": post.updated.isoformat(),
+        "image": post.thumbnail or (post.image.url if post.image else None),
+        "comments": post.comment_count,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        "id": comment.pk,
+        "author": comment.author.username,
+        "text": comment.text,
+        "created": comment.created.isoformat(),
+    }
+
+
+def _link(request, cursor):
+    if cursor is None:
+        return None
+    return request.build_absolute_uri(f"{request.path}?cursor={cursor}")
+
+
+def _conditional(request, versions, last_modified, build, private=False, by_date=True):
+    """Отвечает 304 по versions и last_modified или строит ответ вызовом build().
+
+    by_date=False: If-Modified-Since не проверяется. Так у лент: удаление
+    поста меняет состав страницы, не сдвигая самую позднюю дату на ней.
+    """
+    etag = quote_etag(hashlib.md5(repr(versions).encode()).hexdigest())
+    timestamp = calendar.timegm(last_modified.utctimetuple()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp if by_date else None)
+    if response is None:
+        response = JsonResponse(build(), json_dumps_params={"ensure_ascii": False, "separators": (",", ":")})
+    response["ETag"] = etag
+    if timestamp is not None:
+        response["Last-Modified"] = http_date(timestamp)
+    # кэши могут хранить ответ, но обязаны сверяться с сервером
+    patch_cache_control(response, no_cache=True, **{"private" if private else "public": True})
+    if private:
+        patch_vary_headers(response, ["Cookie"])
+    return response
+
+
+def _last_modified(updated, scopes):
+    """Самое позднее из updated и времени изменения источников: переименование
+    автора или группы не трогает Post.updated."""
+    timestamp = caching.modified(*scopes)
+    if timestamp is None:
+        return updated
+    changed = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+    return max(updated, changed)
+
+
+def feed_response(request, queryset, scopes, private=False):
+    """Страница ленты queryset по ?cursor=; scopes — источники, как у HTML-ленты."""
+    # для ETag хватает id и времени изменения: постов целиком не нужно
+    keys = queryset.select_related(None).only("pk", "pub_date", "updated")
+    page = CursorPaginator(keys, PER_PAGE).get_page(request.GET.get("cursor"))
+    versions = [(post.pk, post.updated.isoformat()) for post in page] + [page.next_cursor, page.previous_cursor]
+    versions += caching.versions(*scopes)
+    last_modified = max((post.updated for post in page), default=None)
+
+    def build():
+        posts = queryset.in_bulk([post.pk for post in page])
+        return {
+            "results": [serialize_post(posts[post.pk]) for post in page if post.pk in posts],
+            "next": _link(request, page.next_cursor),
+            "previous": _link(request, page.previous_cursor),
+        }
+    return _conditional(request, versions, last_modified, build, private, by_date=False)
+
+
+@require_GET
+def index(request):
+    return feed_response(request, Post.objects.for_feed(), [caching.POSTS_SCOPE])
+
+
+@require_GET
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return feed_response(request, Post.objects.filter(group=group).for_feed(), [caching.POSTS_SCOPE])
+
+
+@require_GET
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return feed_response(
+        request, Post.objects.filter(author=author).for_feed(), [caching.author_scope(author.pk)],
+    )
+
+
+@require_GET
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({"detail": "Требуется авторизация"}, status=401)
+    authors = Follow.objects.filter(user=request.user).values_list("author_id", flat=True)
+    scopes = [caching.reader_scope(request.user.pk)] + [caching.author_scope(pk) for pk in authors]
+    return feed_response(request, timeline.follow_feed(request.user), scopes, private=True)
+
+
+def _comments_page(post, cursor):
+    comments = post.comments.select_related("author")
+    return CursorPaginator(comments, COMMENTS_PER_PAGE, ordering=("-created", "-pk")).get_page(cursor)
+
+
+@require_GET
+def post_detail(request, username, post_id):
+    post = get_object_or_404(Post.objects.for_feed(), author__username=username, pk=post_id)
+
+    def build():
+        comments = _comments_page(post, None)
+        data = serialize_post(post)
+        data["comment_list"] = {
+            "results": [serialize_comment(comment) for comment in comments],
+            "next": request.build_absolute_uri(
+                f"{request.path}comments/?cursor={comments.next_cursor}"
+            ) if comments.next_cursor else None,
+        }
+        return data
+    # добавление и удаление комментария тоже сдвигает post.updated,
+    # переименования автора, группы и комментаторов — поколение автора
+    scopes = [caching.author_scope(post.author_id)]
+    versions = [post.pk, post.updated.isoformat()] + caching.versions(*scopes)
+    return _conditional(request, versions, _last_modified(post.updated, scopes), build)
+
+
+@require_GET
+def post_comments(request, username, post_id):
+    post = get_object_or_404(Post, author__username=username, pk=post_id)
+    cursor = request.GET.get("cursor")
+
+    def build():
+        comments = _comments_page(post, cursor)
+        return {
+            "results": [serialize_comment(comment) for comment in comments],
+            "next": _link(request, comments.next_cursor),
+            "previous": _link(request, comments.previous_cursor),
+        }
+    scopes = [caching.author_scope(post.author_id)]
+    versions = [post.pk, post.updated.isoformat(), cursor] + caching.versions(*scopes)
+    return _conditional(request, versions, _last_modified(post.updated, scopes), build)
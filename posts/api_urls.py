@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import api
+
+urlpatterns = [
+    path("posts/", api.index, name="api_index"),
+    path("groups/<slug>/posts/", api.group_posts, name="api_group"),
+    path("follow/posts/", api.follow_index, name="api_follow_index"),
+    path("users/<username>/posts/", api.profile, name="api_profile"),
+    path("users/<username>/posts/<int:post_id>/", api.post_detail, name="api_post"),
+    path("users/<username>/posts/<int:post_id>/comments/", api.post_comments, name="api_post_comments"),
+]
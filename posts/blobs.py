@@ -0,0 +1,98 @@
+"""Счётчик ссылок постов на файлы картинок и сборка мусора.
+
+Файл в posts/storage.py может понадобиться нескольким постам, поэтому
+пост его не удаляет: сигналы поста ведут счётчик ссылок в MediaBlob
+(retain() и release()), а команда collect_media удаляет файлы без ссылок
+вместе с их миниатюрами. Удаление откладывается на grace: файл
+записывается раньше, чем коммитится пост, и транзакция ещё может ссылку
+создать или откатить.
+"""
+import datetime as dt
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import MediaBlob, Post
+from .storage import BLOB_NAME, post_images
+
+
+def retain(name):
+    """Пост сослался на файл name."""
+    if not name:
+        return
+    if MediaBlob.objects.filter(name=name).update(refs=F("refs") + 1, updated=timezone.now()):
+        return
+    # строка создаётся при первой ссылке; сохранённый пост уже учтён в пересчёте
+    MediaBlob.objects.get_or_create(name=name, defaults={"refs": Post.objects.filter(image=name).count()})
+
+
+def release(name):
+    """Пост перестал ссылаться на файл name."""
+    if name:
+        MediaBlob.objects.filter(name=name).update(refs=Greatest(F("refs") - 1, 0), updated=timezone.now())
+
+
+def reconcile():
+    """Пересчитывает ссылки по постам. Возвращает число исправленных строк."""
+    known = set(MediaBlob.objects.values_list("name", flat=True))
+    referenced = Post.objects.exclude(image="").exclude(image=None).values_list("image", flat=True).distinct()
+    MediaBlob.objects.bulk_create(
+        (MediaBlob(name=name) for name in referenced.iterator() if name not in known), ignore_conflicts=True,
+    )
+    actual = Coalesce(Subquery(
+        Post.objects.filter(image=OuterRef("name")).order_by().values("image")
+        .annotate(total=Count("pk")).values("total"),
+        output_field=IntegerField(),
+    ), 0)
+    drifted = MediaBlob.objects.annotate(actual=actual).exclude(refs=F("actual"))
+    fixed = drifted.count()
+    if fixed:
+        MediaBlob.objects.filter(name__in=drifted.values("name")).update(refs=actual, updated=timezone.now())
+    return fixed
+
+
+def _delete(name):
+    # миниатюры sorl и записи о них удаляются вместе с исходником
+    from sorl.thumbnail import delete
+    from sorl.thumbnail.images import ImageFile
+
+    delete(ImageFile(name, post_images))
+
+
+def collect(grace=dt.timedelta(hours=24), dry_run=False, directory="posts"):
+    """Удаляет файлы, на которые дольше grace не ссылается ни один пост.
+
+    Это строки MediaBlob без ссылок и файлы с именем-хэшем, у которых
+    строки нет вовсе (пост с ними не закоммитился). Возвращает
+    (число файлов, байт).
+    """
+    cutoff = timezone.now() - grace
+    deleted = freed = 0
+
+    def remove(name):
+        nonlocal deleted, freed
+        # файл, который только что загрузили ещё раз, не трогаем
+        if not post_images.exists(name) or post_images.get_modified_time(name) >= cutoff:
+            return
+        freed += post_images.size(name)
+        deleted += 1
+        if not dry_run:
+            _delete(name)
+
+    unreferenced = MediaBlob.objects.filter(refs=0, updated__lt=cutoff)
+    for name in list(unreferenced.values_list("name", flat=True)):
+        # строка удаляется, только если на неё так и не сослались
+        if dry_run or MediaBlob.objects.filter(name=name, refs=0, updated__lt=cutoff).delete()[0]:
+            remove(name)
+
+    if not post_images.exists(directory):
+        return deleted, freed
+    known = set(MediaBlob.objects.values_list("name", flat=True))
+    for shard in post_images.listdir(directory)[0]:
+        for filename in post_images.listdir(f"{directory}/{shard}")[1]:
+            name = f"{directory}/{shard}/{filename}"
+            # недописанные .part остаются после падения посреди записи
+            if (BLOB_NAME.match(filename) or filename.endswith(".part")) and name not in known:
+                remove(name)
+    return deleted, freed
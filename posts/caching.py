@@ -0,0 +1,137 @@
+"""Кэш лент с точной инвалидацией через счётчики поколений.
+
+Каждый источник изменений — автор или читатель ленты — имеет в кэше
+номер поколения. Ключ закэшированной ленты включает поколения всех
+источников, от которых она зависит, поэтому запись поста, комментарий
+или подписка просто увеличивают номер, и старые ключи больше не читаются.
+Время жизни записей нужно только для вытеснения, а не для свежести.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from yatube import metrics, routers
+
+
+# все посты сайта: главная страница
+POSTS_SCOPE = "posts"
+
+
+def author_scope(user_id):
+    """Посты автора и комментарии к ним."""
+    return f"author:{user_id}"
+
+
+def reader_scope(user_id):
+    """Подписки читателя."""
+    return f"reader:{user_id}"
+
+
+def _key(scope):
+    return f"generation:{scope}"
+
+
+def _initial():
+    # после вытеснения номер не начинается заново с 1,
+    # иначе он мог бы совпасть с поколением старых записей
+    return int(time.time() * 1000)
+
+
+def versions(*scopes):
+    keys = [_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = {key: _initial() for key in keys if key not in found}
+    for key, value in missing.items():
+        cache.add(key, value, None)
+    if missing:
+        found.update(cache.get_many(list(missing)))
+    return [found.get(key, 0) for key in keys]
+
+
+def _modified_key(scope):
+    return f"modified:{scope}"
+
+
+def _increment(scopes):
+    for scope in scopes:
+        try:
+            cache.incr(_key(scope))
+        except ValueError:
+            cache.set(_key(scope), _initial(), None)
+    cache.set_many({_modified_key(scope): time.time() for scope in scopes}, None)
+
+
+def modified(*scopes):
+    """Время последнего изменения источников (unix time) или None, если оно
+    не сохранилось в кэше, например после вытеснения."""
+    found = cache.get_many([_modified_key(scope) for scope in scopes])
+    if len(found) < len(scopes):
+        return None
+    return max(found.values())
+
+
+def remember_modified(scopes, timestamp):
+    """Запоминает время, посчитанное по базе. add, а не set: если источник
+    успел измениться, более позднее время из _increment не затирается."""
+    for scope in scopes:
+        cache.add(_modified_key(scope), timestamp, None)
+
+
+def bump(*scopes):
+    """Делает закэшированные ленты этих источников устаревшими.
+
+    Номер увеличивается сразу и ещё раз после коммита: запрос, успевший
+    закэшировать ленту по данным до коммита, положил её под уже старый номер.
+    """
+    _increment(scopes)
+    transaction.on_commit(lambda: _increment(scopes))
+
+
+def _feed_key(name, generations, token, owner):
+    # страница с отстающей реплики могла собраться без поста, который уже
+    # есть под текущим поколением; читающий с основной базы её не получает
+    source = "replica" if routers.reading_replica() else "primary"
+    parts = [name, token, str(owner or ""), source] + [str(version) for version in generations]
+    return "feed:" + hashlib.md5(":".join(parts).encode()).hexdigest()
+
+
+def feed_key(name, scopes, token="", owner=None):
+    return _feed_key(name, versions(*scopes), token, owner)
+
+
+def render_feed(request, template, context, name, scopes, build_page):
+    """Рендерит страницу, беря список постов с пагинатором из кэша.
+
+    build_page() возвращает (paginator, page) и вызывается только при промахе.
+    Всё, что зависит от посетителя, рендерится в template вне кэша.
+    Единственная персональная часть списка — ссылки «Редактировать»,
+    поэтому общий вариант страницы делят все, у кого на ней нет своих
+    постов, а авторы получают собственный вариант.
+    """
+    token = request.GET.get("cursor") or request.GET.get("page") or ""
+    user = request.user
+    generations = versions(*scopes)
+    shared_key = _feed_key(name, generations, token, None)
+    own_key = _feed_key(name, generations, token, user.pk) if user.is_authenticated else None
+    entries = cache.get_many([key for key in (shared_key, own_key) if key])
+    entry = entries.get(own_key)
+    if entry is None:
+        entry = entries.get(shared_key)
+        if entry is not None and user.pk in entry["authors"]:
+            entry = None
+    metrics.cache_result("feed", entry is not None)
+    if entry is None:
+        paginator, page = build_page()
+        feed_context = dict(context, paginator=paginator, page=page)
+        authors = {post.author_id for post in page}
+        entry = {"html": render_to_string("feed.html", feed_context, request), "authors": authors}
+        timeout = settings.REPLICA_FEED_CACHE_TIMEOUT if routers.reading_replica() else settings.FEED_CACHE_TIMEOUT
+        cache.set(own_key if user.pk in authors else shared_key, entry, timeout)
+    context["feed"] = mark_safe(entry["html"])
+    return render(request, template, context)
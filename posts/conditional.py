@@ -0,0 +1,71 @@
+"""Условные ответы и заголовки кэширования HTML-страниц.
+
+ETag страницы строится из номеров поколений (см. posts/caching.py), поэтому
+считается без запросов к базе и меняется при любой правке, которую видно
+на странице, включая удаление постов. Last-Modified — время последнего
+изменения тех же источников; если оно вытеснено из кэша, берётся самое
+позднее Post.updated по индексу. Страницы, прочитанные с реплики, отдаются
+без обоих заголовков: реплика отстаёт, и её тело может быть старше них.
+Страницы различаются для разных посетителей, и ключ включает пользователя
+и CSRF-токен формы. Анонимные страницы разрешено хранить общим кэшам
+HTML_CACHE_MAX_AGE секунд.
+"""
+import datetime
+import functools
+import hashlib
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from yatube import routers
+
+from . import caching
+
+
+def page_etag(request, scopes, *parts):
+    # тело с отстающей реплики старше текущих поколений: ETag из них
+    # отвечал бы 304 на страницу без уже записанных постов
+    if routers.reading_replica():
+        return None
+    user = request.user
+    key = [
+        request.get_full_path(),
+        user.pk if user.is_authenticated else None,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME) if user.is_authenticated else None,
+    ]
+    if user.is_authenticated:
+        # кнопки подписки и пункты меню зависят от подписок посетителя
+        scopes = list(scopes) + [caching.reader_scope(user.pk)]
+    key += caching.versions(*scopes) + list(parts)
+    return hashlib.md5(repr(key).encode()).hexdigest()
+
+
+def last_modified(scopes, queryset):
+    """Время изменения страницы: из кэша поколений, а если его там нет —
+    самое позднее Post.updated среди постов queryset по индексу; оно
+    запоминается в кэше до следующего изменения."""
+    # время изменения из кэша тоже новее страницы с реплики
+    if routers.reading_replica():
+        return None
+    timestamp = caching.modified(*scopes)
+    if timestamp is not None:
+        return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+    last = queryset.aggregate(last=Max("updated"))["last"]
+    if last is not None:
+        caching.remember_modified(scopes, last.timestamp())
+    return last
+
+
+def cache_headers(view):
+    """Cache-Control и Vary: Cookie для страниц, открытых и анонимам."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True, max_age=settings.HTML_CACHE_MAX_AGE)
+        patch_vary_headers(response, ["Cookie"])
+        return response
+    return wrapper
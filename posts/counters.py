@@ -0,0 +1,90 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import AuthorStats, Comment, Follow, Post, User
+
+
+def _count(queryset, field):
+    """Подзапрос «сколько строк queryset ссылается на OuterRef("pk") через field»."""
+    counted = (
+        queryset.filter(**{field: OuterRef("pk")}).order_by()
+        .values(field).annotate(total=Count("pk")).values("total")
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def recount(user_id):
+    """Точные значения счётчиков пользователя, посчитанные по таблицам."""
+    return {
+        "posts": Post.objects.filter(author_id=user_id).count(),
+        "followers": Follow.objects.filter(author_id=user_id).count(),
+        "following": Follow.objects.filter(user_id=user_id).count(),
+    }
+
+
+def change(user_id, **deltas):
+    """Сдвигает счётчики пользователя на deltas одним UPDATE.
+
+    Строки со счётчиками создаются лениво: при первом увеличении
+    значения берутся пересчётом, в котором текущее событие уже учтено.
+    """
+    updates = {
+        name: Greatest(F(name) + delta, 0) if delta < 0 else F(name) + delta
+        for name, delta in deltas.items()
+    }
+    if AuthorStats.objects.filter(user_id=user_id).update(**updates):
+        return
+    if any(delta > 0 for delta in deltas.values()):
+        AuthorStats.objects.get_or_create(user_id=user_id, defaults=recount(user_id))
+
+
+def change_comments(post_id, delta):
+    value = F("comment_count") + delta
+    Post.objects.filter(pk=post_id).update(
+        comment_count=Greatest(value, 0) if delta < 0 else value, updated=timezone.now(),
+    )
+
+
+def attach(user):
+    """Счётчики пользователя, загруженного с select_related("stats").
+
+    Строка AuthorStats пришла тем же запросом, что и пользователь; у кого
+    её ещё нет, получает нули.
+    """
+    try:
+        user.stats
+    except AuthorStats.DoesNotExist:
+        user.stats = AuthorStats(user_id=user.pk)
+    return user.stats
+
+
+def reconcile():
+    """Чинит расхождения счётчиков с таблицами. Возвращает число исправленных строк.
+
+    Расхождения ищутся и исправляются set-based запросами, поэтому команда
+    годится и для первичного заполнения после bulk_create.
+    """
+    comments = _count(Comment.objects.all(), "post")
+    drifted_posts = Post.objects.annotate(actual=comments).exclude(comment_count=F("actual"))
+    fixed = drifted_posts.count()
+    if fixed:
+        Post.objects.filter(pk__in=drifted_posts.values("pk")).update(comment_count=comments)
+
+    missing = User.objects.filter(stats__isnull=True).values_list("pk", flat=True)
+    AuthorStats.objects.bulk_create(
+        (AuthorStats(user_id=pk) for pk in missing.iterator()), ignore_conflicts=True,
+    )
+    actual = {
+        "posts": _count(Post.objects.all(), "author"),
+        "followers": _count(Follow.objects.all(), "author"),
+        "following": _count(Follow.objects.all(), "user"),
+    }
+    drifted_stats = (
+        AuthorStats.objects.annotate(**{f"actual_{name}": value for name, value in actual.items()})
+        .exclude(posts=F("actual_posts"), followers=F("actual_followers"), following=F("actual_following"))
+    )
+    drifted = drifted_stats.count()
+    if drifted:
+        AuthorStats.objects.filter(pk__in=drifted_stats.values("pk")).update(**actual)
+    return fixed + drifted
@@ -1,5 +1,7 @@
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
 
+from posts import images
 from posts.models import Post, Comment
 
 # cоздание класса формы
@@ -8,6 +10,20 @@ class PostForm(ModelForm):
         model = Post
         fields = ["group", "text", "image"]
 
+    def clean_image(self):
+        image = self.cleaned_data.get("image")
+        # без новой загрузки здесь прежний файл поста или False при очистке
+        if isinstance(image, UploadedFile):
+            image = images.ingest(image)
+        return image
+
+    def save(self, commit=True):
+        if "image" in self.changed_data:
+            image = self.cleaned_data["image"]
+            self.instance.image_width = image.width if image else None
+            self.instance.image_height = image.height if image else None
+        return super().save(commit)
+
 
 class CommentForm(ModelForm):
     class Meta:
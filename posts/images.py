@@ -0,0 +1,75 @@
+"""Обработка картинок постов при загрузке.
+
+Оригинал с телефона весит мегабайты, и раньше он хранился как есть: его
+отдавали целиком, а sorl заново декодировал для каждой миниатюры. Теперь
+PostForm пропускает загрузку через ingest(): картинка уменьшается до
+POST_IMAGE_MAX_SIDE по большей стороне, поворачивается по EXIF и
+перекодируется в POST_IMAGE_FORMAT (прогрессивный JPEG или WebP).
+EXIF, XMP и комментарии при перекодировании отбрасываются, цветовой
+профиль сохраняется. У анимированных GIF остаётся первый кадр.
+
+Django уже сохранил загрузку больше FILE_UPLOAD_MAX_MEMORY_SIZE во
+временный файл; Pillow читает его лениво, и JPEG декодируется сразу
+в уменьшенном масштабе (draft). Результат пишется во временный файл,
+который в память переходит только для небольших картинок.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from PIL import Image, ImageOps
+
+EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp"}
+# меньшие картинки перекодируются в памяти
+SPOOL_SIZE = 1024 * 1024
+
+
+def _encode_options(image_format):
+    if image_format == "JPEG":
+        return {"quality": settings.POST_IMAGE_QUALITY, "progressive": True, "optimize": True}
+    return {"quality": settings.POST_IMAGE_QUALITY, "method": 4}
+
+
+def _flatten(image, image_format):
+    """Режим, который умеет формат; прозрачность JPEG заменяет белым фоном."""
+    if image.mode == "P":
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+    if image.mode in ("RGBA", "LA"):
+        if image_format == "WEBP":
+            return image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB") if image.mode != "RGB" else image
+
+
+def ingest(upload):
+    """Перекодированная картинка: File с атрибутами width и height.
+
+    upload — загруженный файл, который forms.ImageField уже проверил.
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    if image.width * image.height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            "Картинка слишком большая: не больше %(limit)d мегапикселей.",
+            code="image_too_large", params={"limit": settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+        )
+    side = settings.POST_IMAGE_MAX_SIDE
+    # JPEG декодируется сразу в 1/2, 1/4 или 1/8 размера, если его хватает
+    image.draft("RGB", (side, side))
+    icc_profile = image.info.get("icc_profile")
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((side, side), Image.LANCZOS)
+    image_format = settings.POST_IMAGE_FORMAT
+    image = _flatten(image, image_format)
+
+    output = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+    image.save(output, image_format, icc_profile=icc_profile, **_encode_options(image_format))
+    output.seek(0)
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    result = File(output, name=f"{stem}.{EXTENSIONS[image_format]}")
+    result.width, result.height = image.size
+    return result
@@ -0,0 +1,21 @@
+import datetime as dt
+
+from django.core.management.base import BaseCommand
+
+from posts import blobs
+
+
+class Command(BaseCommand):
+    help = "Удаляет файлы картинок, на которые не ссылается ни один пост, вместе с миниатюрами"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace-hours", type=float, default=24, help="сколько ждать, прежде чем удалить файл")
+        parser.add_argument("--dry-run", action="store_true", help="только посчитать")
+
+    def handle(self, *args, **options):
+        fixed = blobs.reconcile()
+        deleted, freed = blobs.collect(dt.timedelta(hours=options["grace_hours"]), options["dry_run"])
+        verb = "Можно удалить" if options["dry_run"] else "Удалено"
+        self.stdout.write(self.style.SUCCESS(
+            f"Исправлено счётчиков ссылок: {fixed}. {verb} файлов: {deleted}, {freed / 2 ** 20:.1f} МБ"
+        ))
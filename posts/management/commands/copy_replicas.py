@@ -0,0 +1,29 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = "Копирует основную базу SQLite в файлы реплик из DATABASE_REPLICAS"
+
+    def handle(self, *args, **options):
+        databases = settings.DATABASES
+        if connections[DEFAULT_DB_ALIAS].vendor != "sqlite":
+            raise CommandError("Копировать можно только SQLite; реплики других СУБД настраиваются в самой СУБД")
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("Реплики не настроены: задайте YATUBE_REPLICA_PATHS")
+        source = sqlite3.connect(databases[DEFAULT_DB_ALIAS]["NAME"])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                # backup() снимает согласованную копию, не останавливая запись
+                target = sqlite3.connect(databases[alias]["NAME"])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f"{alias}: {databases[alias]['NAME']}")
+        finally:
+            source.close()
+        self.stdout.write(self.style.SUCCESS(f"Скопировано реплик: {len(settings.DATABASE_REPLICAS)}"))
@@ -0,0 +1,25 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = "Выгружает пользователей, группы, посты, комментарии и подписки в JSON Lines или CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="файл .jsonl, «-» для stdout или каталог для CSV")
+        parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+
+    def handle(self, *args, **options):
+        progress = transfer.Progress(self.stderr.write)
+        output = options["output"]
+        if options["format"] == "csv":
+            transfer.export_csv(output, progress)
+        elif output == "-":
+            transfer.export_jsonl(sys.stdout, progress)
+        else:
+            with open(output, "w", encoding="utf-8") as stream:
+                transfer.export_jsonl(stream, progress)
+        self.stderr.write(self.style.SUCCESS(f"Выгружено {progress.summary()}"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Строит миниатюры постов с картинками, у которых их ещё нет"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="перестроить и уже готовые миниатюры")
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image="").exclude(image__isnull=True)
+        if not options["all"]:
+            posts = posts.filter(thumbnail="")
+        generated = 0
+        for post_id in posts.values_list("pk", flat=True).iterator():
+            thumbnails.generate(post_id)
+            generated += 1
+        self.stdout.write(self.style.SUCCESS(f"Построено миниатюр: {generated}"))
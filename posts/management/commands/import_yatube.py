@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = "Загружает выгрузку export_yatube: файл JSON Lines или каталог CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="файл .jsonl или каталог с CSV-файлами")
+        parser.add_argument(
+            "--checkpoint", help="файл контрольной точки: с него продолжается прерванная загрузка",
+        )
+
+    def handle(self, *args, **options):
+        progress = transfer.Progress(self.stdout.write)
+        transfer.import_path(options["source"], transfer.Checkpoint(options["checkpoint"]), progress)
+        self.stdout.write(f"Загружено {progress.summary()}")
+        transfer.finish()
+        self.stdout.write(self.style.SUCCESS("Счётчики, ленты подписок и поисковый индекс пересчитаны"))
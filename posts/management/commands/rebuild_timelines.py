@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import Follow
+
+
+class Command(BaseCommand):
+    help = "Заново собирает ленты подписок из текущих подписок и постов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("usernames", nargs="*", help="только ленты этих пользователей")
+
+    def handle(self, *args, **options):
+        readers = Follow.objects.order_by().values_list("user_id", flat=True).distinct()
+        if options["usernames"]:
+            readers = readers.filter(user__username__in=options["usernames"])
+        rebuilt = 0
+        for user_id in readers.iterator():
+            timeline.rebuild(user_id)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f"Пересобрано лент: {rebuilt}"))
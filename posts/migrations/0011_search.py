@@ -0,0 +1,58 @@
+# Generated by Django 2.2.6 on 2026-10-18 17:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_fts_table(apps, schema_editor):
+    # таблица FTS5 создаётся только там, где она есть; иначе поиск работает
+    # по SearchTerm, который заполняет manage.py rebuild_search_index
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        if ("ENABLE_FTS5",) not in cursor.fetchall():
+            return
+        cursor.execute(
+            "CREATE VIRTUAL TABLE posts_search USING fts5("
+            "body, comment, post_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 0')"
+        )
+        cursor.execute(
+            "INSERT INTO posts_search (rowid, body, comment, post_id) "
+            "SELECT id, text, '', id FROM posts_post"
+        )
+        cursor.execute(
+            "INSERT INTO posts_search (rowid, body, comment, post_id) "
+            "SELECT -id, '', text, post_id FROM posts_comment"
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS posts_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_post_thumbnail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('comment', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Comment')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['term', 'post'], name='search_term_post_idx'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
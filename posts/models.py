@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .storage import post_images
+
 
 User = get_user_model()
 
@@ -14,12 +16,46 @@ class Group(models.Model):
         return self.slug
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        # автор и группа подтягиваются одним JOIN, число комментариев хранится
+        # в самом посте, чтобы post_item.html не делал запросов на каждый пост
+        return self.select_related("author", "group").order_by("-pub_date", "-pk")
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField("date published", auto_now_add=True)
+    # время последнего изменения поста или его комментариев; по нему API
+    # отвечает 304 на условные запросы, см. posts/api.py
+    updated = models.DateTimeField("date updated", auto_now=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="post_author")
     group = models.ForeignKey(Group, on_delete=models.CASCADE, blank=True, null=True)
-    image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    # файлы лежат по хэшу содержимого, одинаковые загрузки делят один файл
+    image = models.ImageField(upload_to='posts/', storage=post_images, blank=True, null=True)
+    # размеры картинки после обработки при загрузке, см. posts/images.py
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    # готовая миниатюра для ленты, см. posts/thumbnails.py;
+    # пока её нет, шаблон строит миниатюру сам
+    thumbnail = models.CharField(max_length=255, blank=True, editable=False)
+    thumbnail_width = models.PositiveIntegerField(null=True, editable=False)
+    thumbnail_height = models.PositiveIntegerField(null=True, editable=False)
+    # счётчик поддерживается сигналами, см. posts/counters.py
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-pub_date", "-id"], name="post_date_idx"),
+            models.Index(fields=["author", "-pub_date", "-id"], name="post_author_date_idx"),
+            models.Index(fields=["group", "-pub_date", "-id"], name="post_group_date_idx"),
+            # Last-Modified страниц: MAX(updated) читается с края индекса
+            models.Index(fields=["updated"], name="post_updated_idx"),
+            models.Index(fields=["author", "updated"], name="post_author_updated_idx"),
+            models.Index(fields=["group", "updated"], name="post_group_updated_idx"),
+        ]
 
     def __str__(self):
         return self.text
@@ -31,6 +67,11 @@ class Comment(models.Model):
     text = models.TextField()
     created = models.DateTimeField("date published", auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["post", "created", "id"], name="comment_post_created_idx"),
+        ]
+
     def __str__(self):
         return self.text
 
@@ -38,7 +79,72 @@ class Comment(models.Model):
 class Follow(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="follower")
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="following")
-    
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "author"], name="unique_follow"),
+        ]
+
     def __str__(self):
         return self.user
-        
\ No newline at end of file
+        
+
+class AuthorStats(models.Model):
+    """Счётчики профиля, пересчитываемые при записи, а не при каждом просмотре."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    posts = models.PositiveIntegerField(default=0)
+    followers = models.PositiveIntegerField(default=0)
+    following = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.posts}/{self.followers}/{self.following}"
+
+
+class MediaBlob(models.Model):
+    """Сколько постов ссылается на файл картинки, см. posts/blobs.py."""
+    name = models.CharField(max_length=255, primary_key=True)
+    refs = models.PositiveIntegerField(default=0)
+    # последнее изменение refs: файл без ссылок удаляется не сразу
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.refs}"
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписок читателя, разложенный туда при публикации."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="timeline")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="timeline_entries")
+    # копия даты поста: лента сортируется и обрезается без JOIN
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "post"], name="unique_timeline_entry"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-pub_date"], name="timeline_user_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.post_id}"
+
+
+class SearchTerm(models.Model):
+    """Запись обратного индекса поиска: слово, пост и сколько раз слово встречается.
+
+    Используется, когда в базе нет SQLite FTS5, см. posts/search.py.
+    Слова комментария относятся к его посту, но удаляются вместе с комментарием.
+    """
+    term = models.CharField(max_length=100)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="search_terms")
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, null=True, related_name="search_terms")
+    count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["term", "post"], name="search_term_post_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.term}: {self.post_id}"
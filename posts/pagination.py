@@ -0,0 +1,150 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+
+class CursorPage:
+    """Страница ленты, открытая по курсору. Повторяет интерфейс Page,
+    которым пользуются шаблоны, но не знает номера страницы и их общего числа."""
+
+    is_cursor_page = True
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return "<Cursor page of %s objects>" % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Постраничный вывод по ключу (pub_date, id).
+
+    Вместо COUNT(*) и OFFSET следующая страница выбирается условием
+    «строго после последнего показанного поста», поэтому любая страница
+    стоит столько же, сколько первая. Курсор — непрозрачный токен
+    с направлением и значениями ключа граничного объекта.
+    """
+
+    NEXT = "n"
+    PREVIOUS = "p"
+
+    def __init__(self, object_list, per_page, ordering=("-pub_date", "-pk")):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = ordering
+        self.descending = ordering[0].startswith("-")
+        self.fields = [name.lstrip("-") for name in ordering]
+
+    def _model_field(self, name):
+        opts = self.object_list.model._meta
+        return opts.pk if name == "pk" else opts.get_field(name)
+
+    def encode(self, direction, obj):
+        values = []
+        for name in self.fields:
+            value = getattr(obj, name)
+            values.append(value.isoformat() if hasattr(value, "isoformat") else value)
+        raw = json.dumps([direction, values], separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode(self, cursor):
+        """Возвращает (направление, значения ключа) или None для битого курсора."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            direction, values = json.loads(raw.decode())
+            if direction not in (self.NEXT, self.PREVIOUS) or len(values) != len(self.fields):
+                return None
+            values = [
+                self._model_field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except (binascii.Error, ValueError, TypeError, UnicodeDecodeError,
+                FieldDoesNotExist, ValidationError):
+            return None
+        if any(value is None for value in values):
+            return None
+        return direction, values
+
+    def keyset_filter(self, values, forward):
+        # (a, b) < (x, y)  <=>  a <= x AND (a < x OR (a = x AND b < y));
+        # лишнее на вид a <= x даёт базе диапазон по индексу вместо скана
+        lookup = "lt" if forward == self.descending else "gt"
+        first, second = self.fields
+        return Q(**{f"{first}__{lookup}e": values[0]}) & (
+            Q(**{f"{first}__{lookup}": values[0]})
+            | Q(**{first: values[0], f"{second}__{lookup}": values[1]})
+        )
+
+    def get_page(self, cursor=None):
+        position = self.decode(cursor) if cursor else None
+        if position is None:
+            items = list(self.object_list.order_by(*self.ordering)[:self.per_page + 1])
+            has_more, has_before = len(items) > self.per_page, False
+            items = items[:self.per_page]
+        elif position[0] == self.NEXT:
+            queryset = self.object_list.filter(self.keyset_filter(position[1], forward=True))
+            items = list(queryset.order_by(*self.ordering)[:self.per_page + 1])
+            has_more, has_before = len(items) > self.per_page, True
+            items = items[:self.per_page]
+        else:
+            reverse = [name[1:] if name.startswith("-") else "-" + name for name in self.ordering]
+            queryset = self.object_list.filter(self.keyset_filter(position[1], forward=False))
+            items = list(queryset.order_by(*reverse)[:self.per_page + 1])
+            has_before, has_more = len(items) > self.per_page, True
+            items = items[:self.per_page][::-1]
+        next_cursor = previous_cursor = None
+        if items and has_more:
+            next_cursor = self.encode(self.NEXT, items[-1])
+        if items and has_before:
+            previous_cursor = self.encode(self.PREVIOUS, items[0])
+        return CursorPage(items, self, next_cursor, previous_cursor)
+
+
+def paginate(request, object_list, per_page, count=None):
+    """Возвращает (paginator, page) для ленты постов.
+
+    ?cursor= открывает страницу по ключу. Без курсора работает обычный
+    Paginator, чтобы ссылки вида ?page=N продолжали открываться; стрелки
+    «назад/вперёд» на такой странице уже ведут на курсоры. Известное
+    заранее число постов (count) избавляет Paginator от запроса COUNT.
+    """
+    cursor = request.GET.get("cursor")
+    if cursor:
+        paginator = CursorPaginator(object_list, per_page)
+        return paginator, paginator.get_page(cursor)
+    paginator = Paginator(object_list, per_page)
+    if count is not None:
+        paginator.count = count
+    page = paginator.get_page(request.GET.get("page"))
+    cursors = CursorPaginator(object_list, per_page)
+    page.next_cursor = page.previous_cursor = None
+    if page.has_next():
+        page.next_cursor = cursors.encode(CursorPaginator.NEXT, page[len(page) - 1])
+    if page.has_previous():
+        page.previous_cursor = cursors.encode(CursorPaginator.PREVIOUS, page[0])
+    return paginator, page
@@ -0,0 +1,273 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+Основной движок — виртуальная таблица SQLite FTS5 posts_search: строка
+поста хранит его текст в колонке body под rowid = id поста, строка
+комментария — текст в колонке comment под rowid = -id комментария.
+Совпадения группируются по посту, ранг — лучший bm25 среди его строк,
+текст поста весит вдвое больше комментариев. Пост подходит, если все
+слова запроса есть в нём самом или в его комментариях, не обязательно
+в одной строке, — как и в обратном индексе.
+
+Если FTS5 недоступен (другая СУБД или SQLite собран без него), работает
+обратный индекс в таблице SearchTerm: слова выделяются здесь же, в Python,
+а ранжирование по tf-idf считается одним GROUP BY.
+
+Индексы обновляются сигналами при сохранении и удалении постов
+и комментариев; rebuild() заполняет их заново после bulk_create.
+Выдача листается курсором по (ранг, id поста), без OFFSET.
+"""
+import base64
+import binascii
+import json
+import math
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Count, ExpressionWrapper, F, FloatField, Q, Sum, Value, When
+
+from .models import Comment, Post, SearchTerm
+from .pagination import CursorPage
+
+TABLE = "posts_search"
+# веса колонок body и comment для bm25
+POST_WEIGHT = 2.0
+COMMENT_WEIGHT = 1.0
+NEXT = "n"
+PREVIOUS = "p"
+BATCH_SIZE = 2000
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре, как их делит токенизатор unicode61."""
+    return re.findall(r"[^\W_]+", (text or "").lower())
+
+
+class FtsEngine:
+    name = "fts5"
+
+    # есть ли таблица в базе: проверяется один раз на каждую базу
+    _available = {}
+
+    @classmethod
+    def available(cls):
+        if connection.vendor != "sqlite":
+            return False
+        name = connection.settings_dict["NAME"]
+        if name not in cls._available:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [TABLE])
+                cls._available[name] = cursor.fetchone() is not None
+        return cls._available[name]
+
+    def _replace(self, rowid, body, comment, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [rowid])
+            cursor.execute(
+                f"INSERT INTO {TABLE} (rowid, body, comment, post_id) VALUES (%s, %s, %s, %s)",
+                [rowid, body, comment, post_id],
+            )
+
+    def _delete(self, rowid):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [rowid])
+
+    def index_post(self, post):
+        self._replace(post.pk, post.text, "", post.pk)
+
+    def unindex_post(self, post_id):
+        self._delete(post_id)
+
+    def index_comment(self, comment):
+        self._replace(-comment.pk, "", comment.text, comment.post_id)
+
+    def unindex_comment(self, comment_id):
+        self._delete(-comment_id)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE}")
+            cursor.execute(
+                f"INSERT INTO {TABLE} (rowid, body, comment, post_id) "
+                f"SELECT id, text, '', id FROM {Post._meta.db_table}"
+            )
+            cursor.execute(
+                f"INSERT INTO {TABLE} (rowid, body, comment, post_id) "
+                f"SELECT -id, '', text, post_id FROM {Comment._meta.db_table}"
+            )
+
+    def ranked(self, terms, position, forward, limit):
+        # каждое слово в кавычках: операторы FTS5 из запроса не выполняются
+        quoted = [f'"{term}"' for term in terms]
+        # bm25 нельзя звать внутри агрегата: ранги строк считаются в подзапросе,
+        # а LIMIT -1 не даёт SQLite слить его с внешним запросом
+        rows = (
+            f"SELECT post_id, MIN(rank) AS score FROM ("
+            f"SELECT post_id, bm25({TABLE}, %s, %s) AS rank FROM {TABLE} "
+            f"WHERE {TABLE} MATCH %s{{condition}} LIMIT -1) GROUP BY post_id"
+        )
+        sql = rows.format(condition="")
+        params = [POST_WEIGHT, COMMENT_WEIGHT, " ".join(quoted)]
+        if len(terms) > 1:
+            # слова могут быть разнесены по тексту поста и комментариям:
+            # такие посты находятся пересечением постов каждого слова (у строки
+            # поста id — это rowid, post_id читается только у комментариев)
+            # и ранжируются по своим строкам, где есть хоть одно слово
+            owner = "CASE WHEN rowid > 0 THEN rowid ELSE post_id END"
+            found = " INTERSECT ".join(f"SELECT {owner} FROM {TABLE} WHERE {TABLE} MATCH %s" for _ in terms)
+            split = rows.format(condition=f" AND {owner} IN ({found} EXCEPT SELECT post_id FROM single)")
+            sql = f"WITH single AS ({sql}) SELECT post_id, score FROM single UNION ALL {split}"
+            params += [POST_WEIGHT, COMMENT_WEIGHT, " OR ".join(quoted)] + quoted
+        if position is not None:
+            sign = ">" if forward else "<"
+            sql = f"SELECT post_id, score FROM ({sql}) WHERE (score, post_id) {sign} (%s, %s)"
+            params += position
+        order = "" if forward else " DESC"
+        sql += f" ORDER BY score{order}, post_id{order} LIMIT %s"
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [limit])
+            return [(score, post_id) for post_id, score in cursor.fetchall()]
+
+
+class InvertedIndexEngine:
+    name = "inverted"
+
+    @staticmethod
+    def available():
+        return True
+
+    @staticmethod
+    def _terms(text, post_id, comment_id=None):
+        counts = {}
+        for term in tokenize(text):
+            term = term[:100]
+            counts[term] = counts.get(term, 0) + 1
+        return [
+            SearchTerm(term=term, post_id=post_id, comment_id=comment_id, count=count)
+            for term, count in counts.items()
+        ]
+
+    def index_post(self, post):
+        SearchTerm.objects.filter(post_id=post.pk, comment__isnull=True).delete()
+        SearchTerm.objects.bulk_create(self._terms(post.text, post.pk))
+
+    def unindex_post(self, post_id):
+        SearchTerm.objects.filter(post_id=post_id).delete()
+
+    def index_comment(self, comment):
+        SearchTerm.objects.filter(comment_id=comment.pk).delete()
+        SearchTerm.objects.bulk_create(self._terms(comment.text, comment.post_id, comment.pk))
+
+    def unindex_comment(self, comment_id):
+        SearchTerm.objects.filter(comment_id=comment_id).delete()
+
+    def rebuild(self):
+        SearchTerm.objects.all().delete()
+        posts = ((text, pk, None) for text, pk in Post.objects.values_list("text", "pk").iterator())
+        comments = Comment.objects.values_list("text", "post_id", "pk").iterator()
+        for rows in (posts, comments):
+            batch = []
+            for text, post_id, comment_id in rows:
+                batch.extend(self._terms(text, post_id, comment_id))
+                if len(batch) >= BATCH_SIZE:
+                    SearchTerm.objects.bulk_create(batch)
+                    batch = []
+            SearchTerm.objects.bulk_create(batch)
+
+    def ranked(self, terms, position, forward, limit):
+        frequencies = dict(
+            SearchTerm.objects.filter(term__in=terms).values("term")
+            .annotate(posts=Count("post", distinct=True)).values_list("term", "posts")
+        )
+        if len(frequencies) < len(terms):
+            return []
+        total = Post.objects.count()
+        # меньше — лучше, как у bm25: сортировка у движков одинаковая
+        weight = Case(
+            *[When(term=term, then=Value(-math.log(1 + total / posts))) for term, posts in frequencies.items()],
+            output_field=FloatField(),
+        )
+        place = Case(
+            When(comment__isnull=True, then=Value(POST_WEIGHT)),
+            default=Value(COMMENT_WEIGHT), output_field=FloatField(),
+        )
+        matches = (
+            SearchTerm.objects.filter(term__in=terms).values("post_id")
+            .annotate(found=Count("term", distinct=True), score=Sum(ExpressionWrapper(weight * place * F("count"), output_field=FloatField())))
+            .filter(found=len(terms))
+        )
+        if position is not None:
+            lookup = "gt" if forward else "lt"
+            score, post_id = position
+            matches = matches.filter(
+                Q(**{f"score__{lookup}": score}) | Q(score=score, **{f"post_id__{lookup}": post_id})
+            )
+        order = ["score", "post_id"] if forward else ["-score", "-post_id"]
+        return list(matches.order_by(*order).values_list("score", "post_id")[:limit])
+
+
+def engine():
+    """Движок поиска по настройке SEARCH_BACKEND: auto, fts5 или inverted."""
+    choice = settings.SEARCH_BACKEND
+    if choice == "inverted" or (choice == "auto" and not FtsEngine.available()):
+        return InvertedIndexEngine()
+    return FtsEngine()
+
+
+def index_post(post):
+    engine().index_post(post)
+
+
+def unindex_post(post_id):
+    engine().unindex_post(post_id)
+
+
+def index_comment(comment):
+    engine().index_comment(comment)
+
+
+def unindex_comment(comment_id):
+    engine().unindex_comment(comment_id)
+
+
+def rebuild():
+    engine().rebuild()
+
+
+def encode(direction, score, post_id):
+    raw = json.dumps([direction, [score, post_id]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode(cursor):
+    """(направление, [ранг, id поста]) или None для битого курсора."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        direction, (score, post_id) = json.loads(raw.decode())
+        if direction not in (NEXT, PREVIOUS):
+            return None
+        return direction, [float(score), int(post_id)]
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+
+def search(query, cursor=None, per_page=10):
+    """Страница постов, подходящих под все слова запроса, от лучших к худшим."""
+    terms = list(dict.fromkeys(tokenize(query)))[:10]
+    if not terms:
+        return CursorPage([], None)
+    position = decode(cursor) if cursor else None
+    forward = position is None or position[0] == NEXT
+    rows = engine().ranked(terms, position and position[1], forward, per_page + 1)
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+    posts = Post.objects.for_feed().in_bulk([post_id for _, post_id in rows])
+    items = [posts[post_id] for _, post_id in rows if post_id in posts]
+    next_cursor = previous_cursor = None
+    if rows and (more or not forward):
+        next_cursor = encode(NEXT, *rows[-1])
+    if rows and (position is not None if forward else more):
+        previous_cursor = encode(PREVIOUS, *rows[0])
+    return CursorPage(items, None, next_cursor, previous_cursor)
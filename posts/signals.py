@@ -0,0 +1,130 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import blobs, caching, counters, search, tasks
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+
+def _bump_authors(posts):
+    """Главная и ленты авторов posts: в карточках постов их группа и автор."""
+    author_ids = posts.order_by().values_list("author_id", flat=True).distinct()
+    caching.bump(caching.POSTS_SCOPE, *(caching.author_scope(author_id) for author_id in author_ids))
+
+
+@receiver(pre_save, sender=User)
+def user_renamed(sender, instance, update_fields=None, **kwargs):
+    # вход сохраняет только last_login, и лишний запрос ему не нужен
+    instance._previous_username = None
+    if instance.pk is not None and (update_fields is None or "username" in update_fields):
+        instance._previous_username = (
+            User.objects.filter(pk=instance.pk).values_list("username", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, **kwargs):
+    # id удалённого пользователя может достаться новому: его ленты
+    # не должны совпасть по ключу с закэшированными лентами прежнего
+    if created:
+        caching.bump(caching.author_scope(instance.pk), caching.reader_scope(instance.pk))
+        return
+    previous = getattr(instance, "_previous_username", None)
+    if previous is not None and previous != instance.username:
+        # @username есть в карточках его постов и под его комментариями
+        caching.bump(caching.author_scope(instance.pk))
+        _bump_authors(Post.objects.filter(comments__author=instance))
+
+
+def _forget_group(slug):
+    caches["hot"].delete(f"group:{slug}")
+
+
+@receiver(pre_save, sender=Group)
+def group_renamed(sender, instance, **kwargs):
+    # при смене slug группа не должна открываться по старому адресу
+    if instance.pk is not None:
+        for slug in Group.objects.filter(pk=instance.pk).values_list("slug", flat=True):
+            _forget_group(slug)
+
+
+@receiver(post_save, sender=Group)
+def group_changed(sender, instance, created, **kwargs):
+    _forget_group(instance.slug)
+    if not created:
+        # название группы есть в карточке каждого её поста
+        _bump_authors(Post.objects.filter(group=instance))
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    # посты группы удаляются вместе с ней и сами сдвигают поколения
+    _forget_group(instance.slug)
+
+
+@receiver(pre_save, sender=Post)
+def post_image_replaced(sender, instance, **kwargs):
+    # прежняя картинка нужна, чтобы снять с её файла ссылку после сохранения
+    instance._previous_image = None
+    if instance.pk is not None:
+        instance._previous_image = Post.objects.filter(pk=instance.pk).values_list("image", flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change(instance.author_id, posts=1)
+        tasks.fan_out.delay(instance.pk)
+    previous = getattr(instance, "_previous_image", None) or ""
+    if (instance.image.name or "") != previous:
+        blobs.retain(instance.image.name)
+        blobs.release(previous)
+    search.index_post(instance)
+    caching.bump(caching.POSTS_SCOPE, caching.author_scope(instance.author_id))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change(instance.author_id, posts=-1)
+    blobs.release(instance.image.name)
+    search.unindex_post(instance.pk)
+    caching.bump(caching.POSTS_SCOPE, caching.author_scope(instance.author_id))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    search.index_comment(instance)
+    if created:
+        counters.change_comments(instance.post_id, 1)
+        caching.bump(caching.POSTS_SCOPE, caching.author_scope(instance.post.author_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_comments(instance.post_id, -1)
+    search.unindex_comment(instance.pk)
+    # при каскадном удалении пост может быть уже удалён
+    author_id = Post.objects.filter(pk=instance.post_id).values_list("author_id", flat=True).first()
+    if author_id is not None:
+        caching.bump(caching.POSTS_SCOPE, caching.author_scope(author_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.change(instance.author_id, followers=1)
+        counters.change(instance.user_id, following=1)
+        tasks.backfill.delay(instance.user_id, instance.author_id)
+        caching.bump(caching.reader_scope(instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change(instance.author_id, followers=-1)
+    counters.change(instance.user_id, following=-1)
+    tasks.prune.delay(instance.user_id, instance.author_id)
+    # автор вернулся под лимит: его посты больше не подмешиваются при чтении
+    if AuthorStats.objects.filter(user_id=instance.author_id, followers=settings.FEED_FANOUT_LIMIT).exists():
+        tasks.backfill_followers.delay(instance.author_id)
+    caching.bump(caching.reader_scope(instance.user_id))
@@ -0,0 +1,59 @@
+"""Картинки постов, хранимые по хэшу содержимого.
+
+ContentAddressedStorage сохраняет файл под именем из SHA-256 его байтов:
+posts/ab/ab12…ef.jpg. Одинаковая картинка, загруженная повторно, не
+пишется на диск ещё раз, а получает то же имя — и те же миниатюры sorl,
+которые ищутся по имени исходника. Ссылки постов на файлы считает
+posts/blobs.py.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# имя файла — хэш содержимого и расширение
+BLOB_NAME = re.compile(r"^[0-9a-f]{64}(\.\w+)?$")
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # имя выбирает _save по содержимому, совпадение имён — это дубликат
+        return name
+
+    def blob_name(self, name, digest):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return "/".join(part for part in (directory, digest[:2], digest + extension) if part)
+
+    def _save(self, name, content):
+        sha = hashlib.sha256()
+        for chunk in content.chunks():
+            sha.update(chunk)
+        name = self.blob_name(name, sha.hexdigest())
+        if self.exists(name):
+            # свежая дата защищает файл от blobs.collect(), пока пост не закоммичен
+            os.utime(self.path(name))
+            return name
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # файл появляется под своим именем целиком: одновременная загрузка
+        # тех же байтов заменит его таким же
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as stream:
+                for chunk in content.chunks():
+                    stream.write(chunk)
+            os.chmod(temporary, self.file_permissions_mode or 0o644)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        return name
+
+
+post_images = ContentAddressedStorage()
@@ -0,0 +1,35 @@
+"""Фоновые задачи постов: поддержка лент подписок и миниатюры."""
+from jobs.tasks import task
+
+from . import caching, timeline
+from .models import Post
+# миниатюры строятся задачей, объявленной рядом с кодом построения
+from .thumbnails import generate as generate_thumbnail  # noqa: F401
+
+
+@task
+def fan_out(post_id):
+    post = Post.objects.filter(pk=post_id).only("author_id", "pub_date").first()
+    if post is None:
+        return
+    timeline.fan_out(post)
+    # ленты подписок, закэшированные до раскладки, собраны без этого поста
+    caching.bump(caching.author_scope(post.author_id))
+
+
+@task
+def backfill(user_id, author_id):
+    timeline.backfill(user_id, author_id)
+    caching.bump(caching.reader_scope(user_id))
+
+
+@task
+def backfill_followers(author_id):
+    timeline.backfill_followers(author_id)
+    caching.bump(caching.author_scope(author_id))
+
+
+@task
+def prune(user_id, author_id):
+    timeline.prune(user_id, author_id)
+    caching.bump(caching.reader_scope(user_id))
@@ -0,0 +1,17 @@
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def page_window(page, around=3):
+    """Номера страниц для переключателя: первая, последняя и around соседних
+    с текущей; None на месте пропущенных. На большой ленте ссылок не тысячи."""
+    last = page.paginator.num_pages
+    shown = sorted({1, last} | set(range(max(1, page.number - around), min(last, page.number + around) + 1)))
+    numbers = []
+    for number in shown:
+        if numbers and number - numbers[-1] > 1:
+            numbers.append(None)
+        numbers.append(number)
+    return numbers
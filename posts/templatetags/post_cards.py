@@ -0,0 +1,56 @@
+"""Карточки постов из кэша фрагментов.
+
+{% post_cards page %} рендерит post_item.html для каждого поста страницы,
+но берёт готовый HTML из кэша одним get_many и рендерит только карточки,
+которых там нет. Ключ карточки включает всё, что на ней видно: время
+изменения поста (правка, комментарий, миниатюра сдвигают Post.updated),
+имя автора, группу и то, смотрит ли на карточку её автор (ссылка
+«Редактировать»), а также хеш исходника post_item.html, чтобы после
+правки шаблона старые карточки не читались.
+"""
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from yatube import metrics
+
+register = template.Library()
+
+TEMPLATE = "post_item.html"
+
+
+def _key(post, own, source):
+    group = (post.group.slug, post.group.title) if post.group_id else None
+    parts = [post.pk, post.updated.isoformat(), post.author.username, group, own, source]
+    return "card:" + hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    user = context.get("user")
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    card = get_template(TEMPLATE)
+    source = hashlib.md5(card.template.source.encode()).hexdigest()
+    posts = list(posts)
+    keys = [_key(post, post.author_id == user_id, source) for post in posts]
+    found = cache.get_many(keys)
+    rendered = {}
+    html = []
+    for post, key in zip(posts, keys):
+        fragment = found.get(key)
+        metrics.cache_result("card", fragment is not None)
+        if fragment is None:
+            fragment = rendered[key] = card.render({"post": post, "user": user})
+        html.append(fragment)
+    if rendered:
+        cache.set_many(rendered, settings.FEED_CACHE_TIMEOUT)
+    return mark_safe("\n".join(html))
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    return post_cards(context, [post])
@@ -1,14 +1,53 @@
-from django.core.cache import cache
-from django.core.cache.utils import make_template_fragment_key
-from django.test import TestCase, Client
+import asyncio
+import datetime as dt
+import gzip
+import io
+import json
+import os
+import sqlite3
+import tempfile
+from io import StringIO
 
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connections, transaction
+from django.http import FileResponse, HttpResponse
+from django.test import TestCase, TransactionTestCase, Client, RequestFactory, override_settings
+from PIL import Image
+
+from jobs.models import Job
+from jobs.tasks import run_pending
 from users.forms import User
-from .models import Post, Group, Follow, Comment
+from yatube.asgi_handler import AsgiHandler
+from yatube.cache import TieredCache
+from yatube.cache_server import Protocol, Store
+from yatube.metrics import registry
+from yatube.routers import SESSION_KEY, ReplicaRouter, use_replica
+from yatube.serving import FilesMiddleware
+from yatube.staticfiles import CompressedManifestStaticFilesStorage
+from . import blobs, caching, counters, search, timeline
+from .forms import PostForm
+from .storage import post_images
+from .models import Post, Group, Follow, Comment, AuthorStats, MediaBlob, TimelineEntry
+
+
+class TempMediaMixin:
+    """Загрузки теста попадают во временный MEDIA_ROOT, который удаляется после теста."""
+
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media = override_settings(MEDIA_ROOT=self.media.name)
+        media.enable()
+        self.addCleanup(media.disable)
 
 
-class ProfileTest(TestCase):
+class ProfileTest(TempMediaMixin, TestCase):
 
     def setUp(self):
+        super().setUp()
         cache.clear()
         self.client = Client()
         self.user = User.objects.create_user(username="sarah", email="connor.s@skynet.com", password="12345")
@@ -101,7 +140,8 @@ class ProfileTest(TestCase):
         response = self.client.get("/")
         self.assertEqual(response.status_code, 200)
 
-        key = make_template_fragment_key("index_page")
+        # на странице есть пост sarah, поэтому ей кэшируется свой вариант
+        key = caching.feed_key("index", [caching.POSTS_SCOPE], owner=self.user.pk)
         cashe = cache.get(key)
         self.assertFalse(cashe is None)
 
@@ -116,6 +156,14 @@ class ProfileTest(TestCase):
         self.assertContains(response, newpost.text)
         self.assertTrue(Follow.objects.filter(user=self.user_two, author=self.user).exists())
         
+    def test_follow_is_unique(self):
+        Follow.objects.create(user=self.user_two, author=self.user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.user_two, author=self.user)
+        self.client.login(username="dj", password="123456")
+        self.client.get("/sarah/follow/")
+        self.assertEqual(Follow.objects.filter(user=self.user_two, author=self.user).count(), 1)
+
     def test_unfollowing(self):
         self.client.login(username="dj", password="123456") 
 
@@ -142,3 +190,1190 @@ class ProfileTest(TestCase):
 
         response = self.client.get(f"/{self.user.username}/{self.post.id}/")
         self.assertContains(response, "my_comment")   
+
+
+class FeedQueriesTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.reader = User.objects.create_user(username="reader", password="12345")
+        self.group = Group.objects.create(title="feed", slug="feed")
+        self.author = User.objects.create_user(username="author", password="12345")
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def add_posts(self, count):
+        for i in range(count):
+            author = User.objects.create_user(username=f"user{Post.objects.count()}")
+            post = Post.objects.create(author=self.author, text=f"post {i}", group=self.group)
+            Comment.objects.create(post=post, author=author, text="comment")
+
+    def assert_constant_queries(self, url, queries, per_page=10, login=False):
+        if login:
+            self.client.force_login(self.reader)
+        self.add_posts(1)
+        cache.clear()
+        caches["hot"].clear()
+        with self.assertNumQueries(queries):
+            self.client.get(url)
+        self.add_posts(9)
+        cache.clear()
+        caches["hot"].clear()
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context["page"]), per_page)
+        self.assertContains(response, "1 комментариев")
+
+    # на пустом кэше Last-Modified берётся ещё одним запросом MAX(updated)
+    def test_index_queries(self):
+        self.assert_constant_queries("/", 3)
+
+    def test_group_queries(self):
+        self.assert_constant_queries(f"/group/{self.group.slug}/", 4)
+
+    # автор приходит вместе со счётчиками, COUNT для пагинатора берётся из счётчика
+    def test_profile_queries(self):
+        self.assert_constant_queries(f"/{self.author.username}/", 3, per_page=5)
+
+    def test_profile_queries_logged_in(self):
+        self.assert_constant_queries(f"/{self.author.username}/", 6, per_page=5, login=True)
+
+    def test_follow_queries(self):
+        self.assert_constant_queries("/follow/", 6, login=True)
+
+
+class CursorPaginationTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username="writer", password="12345")
+        self.posts = [Post.objects.create(author=self.user, text=f"post {i}") for i in range(12)]
+        # половина постов с одинаковой датой: порядок держится на id
+        Post.objects.filter(pk__in=[p.pk for p in self.posts[:6]]).update(pub_date=self.posts[0].pub_date)
+
+    def walk(self, response, direction):
+        seen = []
+        while True:
+            page = response.context["page"]
+            seen.extend(post.pk for post in page)
+            cursor = page.next_cursor if direction == "next" else page.previous_cursor
+            if not cursor:
+                return seen, response
+            response = self.client.get(f"/{self.user.username}/", {"cursor": cursor})
+
+    def test_cursor_walk_covers_feed(self):
+        expected = list(Post.objects.filter(author=self.user).for_feed().values_list("pk", flat=True))
+        seen, last = self.walk(self.client.get(f"/{self.user.username}/"), "next")
+        self.assertEqual(seen, expected)
+
+        seen, _ = self.walk(last, "previous")
+        expected_back = []
+        for start in range(0, len(expected), 5)[::-1]:
+            expected_back.extend(expected[start:start + 5])
+        self.assertEqual(seen, expected_back)
+
+    def test_cursor_page_skips_count(self):
+        page = self.client.get(f"/{self.user.username}/").context["page"]
+        # автор и посты: без COUNT(*), счётчики профиля уже в кэше
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/{self.user.username}/", {"cursor": page.next_cursor})
+        self.assertContains(response, "?cursor=")
+
+    def test_page_links_still_work(self):
+        response = self.client.get(f"/{self.user.username}/", {"page": 3})
+        self.assertEqual(len(response.context["page"]), 2)
+        self.assertEqual(response.context["page"].number, 3)
+
+    def test_broken_cursor_opens_first_page(self):
+        response = self.client.get(f"/{self.user.username}/", {"cursor": "garbage!"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["page"][0].pk, self.posts[-1].pk)
+
+
+class CountersTest(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="author")
+        self.reader = User.objects.create_user(username="reader")
+
+    def assert_stats(self, user, posts, followers, following):
+        stats = counters.attach(User.objects.select_related("stats").get(pk=user.pk))
+        self.assertEqual((stats.posts, stats.followers, stats.following), (posts, followers, following))
+
+    def test_counters_follow_writes(self):
+        post = Post.objects.create(author=self.author, text="text")
+        Post.objects.create(author=self.author, text="text")
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        Comment.objects.create(post=post, author=self.reader, text="comment")
+        self.assert_stats(self.author, 2, 1, 0)
+        self.assert_stats(self.reader, 0, 0, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+        follow.delete()
+        post.delete()
+        self.assert_stats(self.author, 1, 0, 0)
+        self.assert_stats(self.reader, 0, 0, 0)
+
+    def test_profile_reads_counters(self):
+        Post.objects.create(author=self.author, text="text")
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = Client().get(f"/{self.author.username}/")
+        self.assertEqual(response.context["count"], 1)
+        self.assertEqual(response.context["f_count"], 1)
+        self.assertEqual(response.context["follow_count"], 0)
+
+    def test_attach_reads_joined_counters(self):
+        Post.objects.create(author=self.author, text="text")
+        Follow.objects.create(user=self.reader, author=self.author)
+        User.objects.create_user(username="newcomer")
+        with self.assertNumQueries(1):
+            users = {user.username: counters.attach(user) for user in User.objects.select_related("stats")}
+        self.assertEqual((users["author"].posts, users["author"].followers), (1, 1))
+        self.assertEqual(users["reader"].following, 1)
+        self.assertEqual(users["newcomer"].posts, 0)
+
+    def test_reconcile_repairs_drift(self):
+        post = Post.objects.create(author=self.author, text="text")
+        Comment.objects.create(post=post, author=self.reader, text="comment")
+        Follow.objects.create(user=self.reader, author=self.author)
+        AuthorStats.objects.filter(user=self.author).update(posts=7, followers=0)
+        Post.objects.filter(pk=post.pk).update(comment_count=5)
+        AuthorStats.objects.filter(user=self.reader).delete()
+
+        call_command("reconcile_counters", stdout=StringIO())
+        self.assert_stats(self.author, 1, 1, 0)
+        self.assert_stats(self.reader, 0, 0, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(counters.reconcile(), 0)
+
+
+class TimelineTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author")
+        self.reader = User.objects.create_user(username="reader")
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed(self):
+        return list(timeline.follow_feed(self.reader).values_list("text", flat=True))
+
+    def test_post_is_fanned_out_to_followers(self):
+        old = Post.objects.create(author=self.author, text="old")
+        self.client.get(f"/{self.author.username}/follow/")
+        new = Post.objects.create(author=self.author, text="new")
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(user=self.reader).values_list("post_id", flat=True)),
+            {old.pk, new.pk},
+        )
+        self.assertEqual(self.feed(), ["new", "old"])
+
+        self.client.get(f"/{self.author.username}/unfollow/")
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_popular_author_is_merged_on_read(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(author=self.author, text="popular")
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), ["popular"])
+
+    @override_settings(FEED_FANOUT_LIMIT=1, JOBS_BACKEND="database")
+    def test_author_back_under_limit_is_fanned_out(self):
+        other = User.objects.create_user(username="other")
+        Follow.objects.create(user=self.reader, author=self.author)
+        follow = Follow.objects.create(user=other, author=self.author)
+        Post.objects.create(author=self.author, text="popular")
+        run_pending()
+        self.assertFalse(TimelineEntry.objects.exists())
+        follow.delete()
+        # до раскладки пост уже не подмешивается при чтении
+        self.assertNotContains(self.client.get("/follow/"), "popular")
+        run_pending()
+        self.assertEqual(self.feed(), ["popular"])
+        self.assertContains(self.client.get("/follow/"), "popular")
+
+    @override_settings(TIMELINE_LENGTH=3)
+    def test_timeline_is_bounded(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        for i in range(5):
+            Post.objects.create(author=self.author, text=f"post {i}")
+        self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 3)
+        self.assertEqual(self.feed(), ["post 4", "post 3", "post 2"])
+
+    def test_rebuild_command(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(author=self.author, text="rebuilt")
+        TimelineEntry.objects.all().delete()
+        self.assertNotContains(self.client.get("/follow/"), "rebuilt")
+        call_command("rebuild_timelines", stdout=StringIO())
+        self.assertEqual(self.feed(), ["rebuilt"])
+        self.assertContains(self.client.get("/follow/"), "rebuilt")
+
+
+class FeedCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author")
+        self.other = User.objects.create_user(username="other")
+        self.reader = User.objects.create_user(username="reader")
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.post = Post.objects.create(author=self.author, text="first")
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_follow_feed_served_from_cache_until_change(self):
+        self.client.get("/follow/")
+        with self.assertNumQueries(3):
+            response = self.client.get("/follow/")
+        self.assertContains(response, "first")
+
+        Post.objects.create(author=self.author, text="second")
+        self.assertContains(self.client.get("/follow/"), "second")
+
+        Comment.objects.create(post=self.post, author=self.other, text="comment")
+        self.assertContains(self.client.get("/follow/"), "1 комментариев")
+
+        self.client.get(f"/{self.author.username}/unfollow/")
+        self.assertNotContains(self.client.get("/follow/"), "first")
+
+    def test_unrelated_post_keeps_follow_feed_key(self):
+        scopes = [caching.reader_scope(self.reader.pk), caching.author_scope(self.author.pk)]
+        key = caching.feed_key("follow", scopes)
+        Post.objects.create(author=self.other, text="unrelated")
+        self.assertEqual(caching.feed_key("follow", scopes), key)
+        Post.objects.create(author=self.author, text="related")
+        self.assertNotEqual(caching.feed_key("follow", scopes), key)
+
+    def test_profile_edit_links_only_for_author(self):
+        self.assertNotContains(self.client.get(f"/{self.author.username}/"), "Редактировать")
+        self.client.force_login(self.author)
+        self.assertContains(self.client.get(f"/{self.author.username}/"), "Редактировать")
+        self.client.force_login(self.other)
+        self.assertNotContains(self.client.get(f"/{self.author.username}/"), "Редактировать")
+
+    def test_profile_pages_cached_separately(self):
+        for i in range(5):
+            Post.objects.create(author=self.author, text=f"post {i}")
+        self.assertNotContains(self.client.get(f"/{self.author.username}/"), "first")
+        self.assertContains(self.client.get(f"/{self.author.username}/", {"page": 2}), "first")
+
+
+class IndexCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author")
+        self.other = User.objects.create_user(username="other")
+        for i in range(12):
+            Post.objects.create(author=self.author if i % 2 else self.other, text=f"post {i}")
+        self.client = Client()
+
+    def test_pages_are_cached_separately(self):
+        first = self.client.get("/")
+        second = self.client.get("/", {"page": 2})
+        self.assertContains(first, "post 11")
+        self.assertNotContains(second, "post 11")
+        self.assertContains(second, "post 0")
+        cursor = first.context["page"].next_cursor
+        self.assertContains(self.client.get("/", {"cursor": cursor}), "post 0")
+
+    def test_anonymous_hit_skips_queries(self):
+        self.client.get("/")
+        with self.assertNumQueries(0):
+            response = self.client.get("/")
+        self.assertContains(response, "post 11")
+
+    def test_edit_links_do_not_leak(self):
+        self.client.force_login(self.author)
+        self.assertContains(self.client.get("/"), "Редактировать")
+        self.client.force_login(self.other)
+        response = self.client.get("/")
+        self.assertContains(response, f"/{self.other.username}/")
+        self.assertNotContains(response, f"/{self.author.username}/{Post.objects.filter(author=self.author).first().pk}/edit/")
+        self.client.logout()
+        self.assertNotContains(self.client.get("/"), "Редактировать")
+
+    def test_new_and_edited_posts_invalidate(self):
+        self.client.force_login(self.author)
+        self.client.get("/")
+        self.client.post("/new/", {"text": "brand new"})
+        self.assertContains(self.client.get("/"), "brand new")
+        post = Post.objects.get(text="brand new")
+        self.client.post(f"/{self.author.username}/{post.pk}/edit/", {"text": "edited"})
+        self.assertContains(self.client.get("/"), "edited")
+
+
+@override_settings(CACHES={
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "shared"},
+    "hot": {"BACKEND": "yatube.cache.TieredCache", "OPTIONS": {"LOCAL_TIMEOUT": 5}},
+})
+class HotCacheTest(TestCase):
+
+    def setUp(self):
+        caches["hot"].clear()
+        self.hot = caches["hot"]
+        self.group = Group.objects.create(title="Группа", slug="hot", description="описание")
+        author = User.objects.create_user(username="writer")
+        Post.objects.create(author=author, text="text", group=self.group)
+
+    def test_reads_shared_tier_after_local_miss(self):
+        # другой процесс: своя память поверх того же общего кэша
+        other = TieredCache("other", {})
+        self.hot.set("key", "value")
+        self.assertEqual(other.get("key"), "value")
+        self.assertEqual(other.get("key"), "value")
+        self.assertEqual(other.stats, {"local_hits": 1, "shared_hits": 1, "misses": 0})
+        other.delete("key")
+        self.assertIsNone(other.get("key"))
+
+    def test_group_lookup_is_cached_and_invalidated(self):
+        self.client.get("/group/hot/")
+        with self.assertNumQueries(2):
+            self.client.get("/group/hot/")
+        self.group.slug = "renamed"
+        self.group.save()
+        self.assertEqual(self.client.get("/group/hot/").status_code, 404)
+        self.assertContains(self.client.get("/group/renamed/"), "Группа")
+
+    def test_renames_invalidate_cached_feeds(self):
+        for url in ("/", "/writer/"):
+            self.assertContains(self.client.get(url), "#Группа")
+        etag = self.client.get("/")["ETag"]
+        self.group.title = "Переименована"
+        self.group.save()
+        self.assertEqual(self.client.get("/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        for url in ("/", "/writer/"):
+            self.assertContains(self.client.get(url), "#Переименована")
+
+        author = User.objects.get(username="writer")
+        author.username = "novelist"
+        author.save()
+        self.assertContains(self.client.get("/"), "@novelist")
+        # вход сохраняет только last_login и ленты не трогает
+        generations = caching.versions(caching.POSTS_SCOPE)
+        author.save(update_fields=["last_login"])
+        self.assertEqual(caching.versions(caching.POSTS_SCOPE), generations)
+
+
+class CacheServerTest(TestCase):
+
+    def setUp(self):
+        self.protocol = Protocol(Store(max_items=2))
+
+    def test_storage_commands(self):
+        self.assertEqual(self.protocol.store_command("set", "a", 0, 0, b"1"), b"STORED")
+        self.assertEqual(self.protocol.store_command("add", "a", 0, 0, b"2"), b"NOT_STORED")
+        self.assertEqual(self.protocol.command([b"incr", b"a", b"5"]), b"6")
+        self.assertEqual(self.protocol.command([b"get", b"a", b"b"]), b"VALUE a 0 1\r\n6\r\nEND")
+        self.assertEqual(self.protocol.command([b"delete", b"a"]), b"DELETED")
+        self.assertEqual(self.protocol.command([b"get", b"a"]), b"END")
+
+    def test_expiry_and_eviction(self):
+        self.protocol.store_command("set", "old", 0, -1, b"x")
+        self.assertEqual(self.protocol.command([b"get", b"old"]), b"END")
+        for key in ("a", "b", "c"):
+            self.protocol.store_command("set", key, 0, 0, b"x")
+        self.assertEqual(list(self.protocol.store.items), ["b", "c"])
+
+
+@override_settings(JOBS_BACKEND="database")
+class ThumbnailTest(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(username="painter", password="12345")
+        self.client.force_login(self.user)
+        with open("./posts/test_files/file.jpg", "rb") as img:
+            self.client.post("/new/", {"text": "text", "image": img})
+        self.post = Post.objects.get(author=self.user)
+
+    def test_feed_uses_stored_thumbnail(self):
+        self.assertEqual(self.post.thumbnail, "")
+        run_pending()
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.thumbnail.endswith(".jpg"))
+        self.assertEqual((self.post.thumbnail_width, self.post.thumbnail_height), (960, 339))
+        self.client.logout()
+        # COUNT и посты: sorl не ходит в своё хранилище
+        with self.assertNumQueries(2):
+            response = self.client.get("/")
+        self.assertContains(response, f'src="{self.post.thumbnail}" width="960" height="339"')
+
+    def test_new_image_drops_old_thumbnail(self):
+        run_pending()
+        with open("./posts/test_files/file.jpg", "rb") as img:
+            self.client.post(f"/{self.user.username}/{self.post.pk}/edit/", {"text": "text", "image": img})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.thumbnail, "")
+        self.assertContains(self.client.get("/"), "<img")
+        self.assertTrue(Job.objects.filter(name="posts.thumbnails.generate", status=Job.QUEUED).exists())
+
+
+class ImageIngestTest(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="painter")
+
+    def upload(self, image, name, image_format, **params):
+        buffer = io.BytesIO()
+        image.save(buffer, image_format, **params)
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def post_form(self, upload, instance=None):
+        form = PostForm({"text": "text"}, {"image": upload}, instance=instance or Post(author=self.user))
+        return form, form.is_valid()
+
+    @override_settings(POST_IMAGE_MAX_SIDE=1024)
+    def test_upload_is_resized_and_stripped(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # снято повёрнутым: при показе повернуть на 90°
+        exif[0x010F] = "Camera"
+        photo = self.upload(Image.new("RGB", (3000, 2000), "red"), "photo.jpeg", "JPEG", exif=exif)
+        form, valid = self.post_form(photo)
+        self.assertTrue(valid)
+        post = form.save()
+        self.assertRegex(post.image.name, r"^posts/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$")
+        self.assertEqual((post.image_width, post.image_height), (683, 1024))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (683, 1024))
+            self.assertTrue(stored.info.get("progressive"))
+            self.assertEqual(len(stored.getexif()), 0)
+
+    @override_settings(POST_IMAGE_FORMAT="WEBP")
+    def test_webp_keeps_transparency(self):
+        form, _ = self.post_form(self.upload(Image.new("RGBA", (40, 30), (0, 0, 0, 0)), "logo.png", "PNG"))
+        post = form.save()
+        with Image.open(post.image.path) as stored:
+            self.assertEqual((stored.format, stored.mode), ("WEBP", "RGBA"))
+
+    def test_jpeg_flattens_transparency_on_white(self):
+        form, _ = self.post_form(self.upload(Image.new("RGBA", (40, 30), (0, 0, 0, 0)), "logo.png", "PNG"))
+        post = form.save()
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.getpixel((0, 0)), (255, 255, 255))
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=10000)
+    def test_too_many_pixels(self):
+        form, valid = self.post_form(self.upload(Image.new("RGB", (200, 100)), "big.png", "PNG"))
+        self.assertFalse(valid)
+        self.assertEqual(form.errors.as_data()["image"][0].code, "image_too_large")
+
+    def test_edit_without_upload_keeps_dimensions(self):
+        form, _ = self.post_form(self.upload(Image.new("RGB", (40, 30)), "small.png", "PNG"))
+        post = form.save()
+        name = post.image.name
+        form = PostForm({"text": "new text"}, instance=post)
+        self.assertTrue(form.is_valid())
+        post = form.save()
+        post.refresh_from_db()
+        self.assertEqual((post.image.name, post.image_width, post.image_height), (name, 40, 30))
+
+
+@override_settings(JOBS_BACKEND="database")
+class MediaBlobTest(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(username="painter")
+        self.client.force_login(self.user)
+
+    def upload(self, text):
+        with open("./posts/test_files/file.jpg", "rb") as img:
+            self.client.post("/new/", {"text": text, "image": img})
+        return Post.objects.get(text=text)
+
+    def files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media.name)
+            for root, _, names in os.walk(self.media.name) for name in names
+        )
+
+    def test_duplicates_share_file_and_thumbnail(self):
+        first = self.upload("first")
+        run_pending()
+        second = self.upload("second")
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(MediaBlob.objects.get(name=first.image.name).refs, 2)
+        # миниатюра скопирована у первого поста, задача не понадобилась
+        self.assertFalse(Job.objects.filter(name="posts.thumbnails.generate", status=Job.QUEUED).exists())
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(second.thumbnail, first.thumbnail)
+        self.assertEqual(len([name for name in self.files() if name.startswith("posts/")]), 1)
+
+    def test_collect_removes_unreferenced_files(self):
+        first, second = self.upload("first"), self.upload("second")
+        run_pending()
+        name = first.image.name
+        first.delete()
+        self.assertEqual(MediaBlob.objects.get(name=name).refs, 1)
+        second.delete()
+        self.assertEqual(MediaBlob.objects.get(name=name).refs, 0)
+        # не закоммиченная загрузка: файл есть, строки нет
+        orphan = post_images.save("posts/orphan.png", io.BytesIO(b"orphan"))
+        self.assertEqual(blobs.collect(), (0, 0))
+        self.assertTrue(post_images.exists(name))
+
+        deleted, freed = blobs.collect(grace=dt.timedelta(0))
+        self.assertEqual(deleted, 2)
+        self.assertEqual(self.files(), [])
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertFalse(post_images.exists(orphan))
+
+    def test_reconcile_counts_references(self):
+        post = self.upload("first")
+        MediaBlob.objects.all().delete()
+        Post.objects.create(author=self.user, text="copy", image=post.image.name)
+        Post.objects.create(author=self.user, text="legacy", image="posts/legacy.jpg")
+        MediaBlob.objects.filter(name=post.image.name).update(refs=7)
+        out = StringIO()
+        call_command("collect_media", stdout=out)
+        self.assertIn("Удалено файлов: 0", out.getvalue())
+        self.assertEqual(dict(MediaBlob.objects.values_list("name", "refs")), {post.image.name: 2, "posts/legacy.jpg": 1})
+        self.assertEqual(blobs.reconcile(), 0)
+
+
+class SearchTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader")
+        self.first = Post.objects.create(author=self.user, text="Рецепт борща со сметаной")
+        self.second = Post.objects.create(author=self.user, text="Сметана на рынке подорожала")
+        self.third = Post.objects.create(author=self.user, text="Погода на выходные")
+        Comment.objects.create(post=self.third, author=self.user, text="Самое время для сметаны и борща")
+
+    def found(self, query, **params):
+        response = self.client.get("/search/", {"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.context["page"]
+
+    def test_finds_posts_and_comments(self):
+        self.assertEqual({post.pk for post in self.found("борща")}, {self.first.pk, self.third.pk})
+        self.assertEqual([post.pk for post in self.found("подорожала")], [self.second.pk])
+        self.assertEqual(len(self.found("")), 0)
+        # синтаксис FTS5 в запросе не ломает поиск
+        self.assertEqual(len(self.found('борща" (*')), 2)
+
+    def test_words_may_be_split_between_post_and_comments(self):
+        giraffe = Post.objects.create(author=self.user, text="жираф")
+        Comment.objects.create(post=giraffe, author=self.user, text="пингвин")
+        Post.objects.create(author=self.user, text="пингвин")
+        self.assertEqual([post.pk for post in self.found("жираф пингвин")], [giraffe.pk])
+        self.assertEqual(len(self.found("жираф пингвин тюлень")), 0)
+
+    def test_post_text_ranks_above_comments(self):
+        self.assertEqual(self.found("борща")[0].pk, self.first.pk)
+
+    def test_index_follows_edits_and_deletes(self):
+        self.first.text = "Рецепт окрошки"
+        self.first.save()
+        self.assertEqual([post.pk for post in self.found("борща")], [self.third.pk])
+        self.third.comments.all().delete()
+        self.assertEqual(len(self.found("борща")), 0)
+        self.second.delete()
+        self.assertEqual(len(self.found("подорожала")), 0)
+
+    def test_cursor_walks_all_results(self):
+        for i in range(25):
+            Post.objects.create(author=self.user, text=f"щи номер {i}")
+        seen = []
+        page = self.found("щи")
+        while True:
+            seen += [post.pk for post in page]
+            if not page.has_next():
+                break
+            page = self.found("щи", cursor=page.next_cursor)
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+        back = self.found("щи", cursor=page.previous_cursor)
+        self.assertEqual([post.pk for post in back], seen[10:20])
+
+    def test_rebuild_restores_index(self):
+        search.engine().rebuild()
+        self.assertEqual(len(self.found("сметаной")), 1)
+
+
+@override_settings(SEARCH_BACKEND="inverted")
+class InvertedSearchTest(SearchTest):
+
+    def setUp(self):
+        search.rebuild()
+        super().setUp()
+
+
+class CommentPageTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="blogger")
+        self.post = Post.objects.create(author=self.author, text="Вирусный пост")
+        self.url = f"/{self.author.username}/{self.post.pk}/"
+
+    def add_comments(self, count):
+        for i in range(count):
+            reader = User.objects.create_user(username=f"reader{Comment.objects.count()}")
+            Comment.objects.create(post=self.post, author=reader, text=f"comment {Comment.objects.count()}")
+
+    def test_post_page_shows_first_page(self):
+        self.add_comments(25)
+        response = self.client.get(self.url)
+        comments = response.context["comments"]
+        self.assertEqual(len(comments), 20)
+        self.assertEqual(comments[0].text, "comment 24")
+        self.assertContains(response, "Показать ещё")
+        rest = self.client.get(f"{self.url}comments/", {"cursor": comments.next_cursor})
+        self.assertEqual([c.text for c in rest.context["comments"]], [f"comment {i}" for i in range(4, -1, -1)])
+        self.assertNotContains(rest, "Показать ещё")
+
+    def test_queries_do_not_grow_with_comments(self):
+        self.add_comments(1)
+        self.client.get(self.url)
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+        self.add_comments(30)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertContains(response, "reader30")
+
+
+class ApiTest(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        self.group = Group.objects.create(title="Группа", slug="api", description="описание")
+        self.posts = [Post.objects.create(author=self.author, text=f"post {i}", group=self.group) for i in range(25)]
+
+    def test_feeds_walk_by_cursor(self):
+        for url in ["/api/v1/posts/", "/api/v1/groups/api/posts/", "/api/v1/users/writer/posts/"]:
+            data = self.client.get(url).json()
+            self.assertEqual(data["results"][0]["text"], "post 24")
+            self.assertEqual(data["results"][0]["group"], "api")
+            self.assertIsNone(data["previous"])
+            rest = self.client.get(data["next"]).json()
+            self.assertEqual([post["text"] for post in rest["results"]], [f"post {i}" for i in range(4, -1, -1)])
+            self.assertIsNone(rest["next"])
+
+    def test_unchanged_page_returns_304_without_loading_posts(self):
+        response = self.client.get("/api/v1/posts/")
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+        # только id и даты постов страницы
+        with self.assertNumQueries(1):
+            cached = self.client.get("/api/v1/posts/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        Comment.objects.create(post=self.posts[-1], author=self.author, text="new")
+        changed = self.client.get("/api/v1/posts/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()["results"][0]["comments"], 1)
+        self.posts[-1].delete()
+        self.assertEqual(self.client.get("/api/v1/posts/", HTTP_IF_NONE_MATCH=changed["ETag"]).status_code, 200)
+
+    def test_post_detail_and_comments(self):
+        post = self.posts[0]
+        for i in range(25):
+            Comment.objects.create(post=post, author=self.author, text=f"comment {i}")
+        response = self.client.get(f"/api/v1/users/writer/posts/{post.pk}/")
+        data = response.json()
+        self.assertEqual(data["comments"], 25)
+        self.assertEqual(len(data["comment_list"]["results"]), 20)
+        rest = self.client.get(data["comment_list"]["next"]).json()
+        self.assertEqual(len(rest["results"]), 5)
+        modified = self.client.get(
+            f"/api/v1/users/writer/posts/{post.pk}/", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"],
+        )
+        self.assertEqual(modified.status_code, 304)
+
+    def test_renames_change_etags(self):
+        post = self.posts[0]
+        # пост и его источники изменились час назад
+        Post.objects.filter(pk=post.pk).update(updated=post.updated - dt.timedelta(hours=1))
+        cache.clear()
+        detail = self.client.get(f"/api/v1/users/writer/posts/{post.pk}/")
+        feed = self.client.get("/api/v1/groups/api/posts/")
+        self.author.username = "novelist"
+        self.author.save()
+        renamed = self.client.get(
+            f"/api/v1/users/novelist/posts/{post.pk}/",
+            HTTP_IF_NONE_MATCH=detail["ETag"], HTTP_IF_MODIFIED_SINCE=detail["Last-Modified"],
+        )
+        self.assertEqual(renamed.status_code, 200)
+        self.assertEqual(renamed.json()["author"], "novelist")
+        modified = self.client.get(
+            f"/api/v1/users/novelist/posts/{post.pk}/", HTTP_IF_MODIFIED_SINCE=detail["Last-Modified"],
+        )
+        self.assertEqual(modified.status_code, 200)
+        self.group.slug = "renamed"
+        self.group.save()
+        feed = self.client.get("/api/v1/groups/renamed/posts/", HTTP_IF_NONE_MATCH=feed["ETag"])
+        self.assertEqual(feed.status_code, 200)
+        self.assertEqual(feed.json()["results"][0]["group"], "renamed")
+
+    def test_follow_feed_is_private(self):
+        self.assertEqual(self.client.get("/api/v1/follow/posts/").status_code, 401)
+        reader = User.objects.create_user(username="reader")
+        Follow.objects.create(user=reader, author=self.author)
+        self.client.force_login(reader)
+        response = self.client.get("/api/v1/follow/posts/")
+        self.assertEqual(len(response.json()["results"]), 20)
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn("Cookie", response["Vary"])
+
+
+class ConditionalViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches["hot"].clear()
+        self.client = Client()
+        self.author = User.objects.create_user(username="writer")
+        self.post = Post.objects.create(author=self.author, text="text")
+
+    def test_unchanged_page_returns_304(self):
+        for url in ["/", "/writer/", f"/writer/{self.post.pk}/"]:
+            response = self.client.get(url)
+            self.assertIn("public", response["Cache-Control"])
+            self.assertIn("Cookie", response["Vary"])
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(cached.status_code, 304)
+            modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+            self.assertEqual(modified.status_code, 304)
+
+    def test_changes_invalidate_etag(self):
+        url = f"/writer/{self.post.pk}/"
+        etag = self.client.get(url)["ETag"]
+        Comment.objects.create(post=self.post, author=self.author, text="comment")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "comment")
+        etag = self.client.get("/")["ETag"]
+        self.post.delete()
+        self.assertEqual(self.client.get("/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_logged_in_pages_are_private(self):
+        reader = User.objects.create_user(username="reader")
+        anonymous = self.client.get("/")["ETag"]
+        self.client.force_login(reader)
+        response = self.client.get("/", HTTP_IF_NONE_MATCH=anonymous)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("private", response["Cache-Control"])
+        # подписка меняет кнопку в профиле
+        etag = self.client.get("/writer/")["ETag"]
+        Follow.objects.create(user=reader, author=self.author)
+        self.assertEqual(self.client.get("/writer/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class TransferTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer", password="secret-pass")
+        self.reader = User.objects.create_user(username="reader")
+        self.group = Group.objects.create(title="Группа", slug="transfer")
+        self.post = Post.objects.create(author=self.author, text="кот в море", group=self.group)
+        Post.objects.create(author=self.author, text="без группы")
+        Comment.objects.create(post=self.post, author=self.reader, text="комментарий")
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.published = dt.datetime(2019, 1, 1, tzinfo=dt.timezone.utc)
+        Post.objects.filter(pk=self.post.pk).update(pub_date=self.published, updated=self.published)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def export(self, *args):
+        call_command("export_yatube", *args, stderr=StringIO())
+
+    def reimport(self, source, *args):
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        call_command("import_yatube", source, *args, stdout=StringIO())
+
+    def assert_restored(self):
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.text, "кот в море")
+        self.assertEqual(post.group.slug, "transfer")
+        self.assertEqual(post.pub_date, self.published)
+        self.assertEqual(post.updated, self.published)
+        self.assertEqual(post.comment_count, 1)
+        self.assertIsNone(Post.objects.get(text="без группы").group)
+        self.assertTrue(User.objects.get(username="writer").check_password("secret-pass"))
+        self.assertEqual(AuthorStats.objects.get(user=self.author).followers, 1)
+        self.assertEqual(list(timeline.follow_feed(self.reader)), list(Post.objects.order_by("-pub_date", "-pk")))
+        self.assertEqual([p.pk for p in search.search("кот")], [self.post.pk])
+
+    def test_jsonl_round_trip(self):
+        path = os.path.join(self.directory.name, "dump.jsonl")
+        self.export(path)
+        with open(path, encoding="utf-8") as stream:
+            models = [json.loads(line)["model"] for line in stream]
+        self.assertEqual(models, ["users", "users", "groups", "posts", "posts", "comments", "follows"])
+        self.reimport(path)
+        self.assert_restored()
+
+    def test_csv_round_trip(self):
+        self.export(self.directory.name, "--format", "csv")
+        self.reimport(self.directory.name)
+        self.assert_restored()
+
+    def test_import_resumes_from_checkpoint(self):
+        path = os.path.join(self.directory.name, "dump.jsonl")
+        checkpoint = os.path.join(self.directory.name, "checkpoint.json")
+        self.export(path)
+        self.reimport(path, "--checkpoint", checkpoint)
+        with open(checkpoint) as stream:
+            self.assertEqual(json.load(stream), {path: 7})
+        # записанные строки второй раз не читаются
+        Comment.objects.all().delete()
+        call_command("import_yatube", path, "--checkpoint", checkpoint, stdout=StringIO())
+        self.assertFalse(Comment.objects.exists())
+        # а без контрольной точки уже загруженные строки пропускаются по ключу
+        call_command("import_yatube", path, stdout=StringIO())
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Post.objects.count(), 2)
+
+
+@override_settings(METRICS_SAMPLE_RATE=1, METRICS_TOKEN="secret")
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+        self.author = User.objects.create_user(username="writer")
+        Post.objects.create(author=self.author, text="text")
+
+    def scrape(self):
+        response = self.client.get("/metrics/", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_metrics_require_token_or_staff(self):
+        self.assertEqual(self.client.get("/metrics/").status_code, 403)
+        self.assertEqual(self.client.get("/metrics/", HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+        staff = User.objects.create_user(username="staff", is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get("/metrics/").status_code, 200)
+
+    def test_sampled_request_details(self):
+        self.client.get("/")
+        self.client.get("/")
+        self.client.get("/missing-user/")
+        metrics = self.scrape()
+        self.assertIn('yatube_requests_total{method="GET",status="200",view="index"} 2', metrics)
+        self.assertIn('yatube_requests_total{method="GET",status="404",view="profile"} 1', metrics)
+        self.assertIn('yatube_request_duration_seconds_count{view="index"} 2', metrics)
+        self.assertIn('yatube_db_queries_bucket{view="index",le="+Inf"} 2', metrics)
+        self.assertIn('yatube_template_render_seconds_count{view="index"} 2', metrics)
+        self.assertIn('yatube_cache_requests_total{cache="feed",result="miss",view="index"} 1', metrics)
+        self.assertIn('yatube_cache_requests_total{cache="feed",result="hit",view="index"} 1', metrics)
+
+    def test_unknown_methods_share_one_series(self):
+        for method in ("FOO", "BAR"):
+            self.client.generic(method, "/")
+        metrics = self.scrape()
+        self.assertIn('yatube_requests_total{method="other",status="200",view="index"} 2', metrics)
+        self.assertNotIn('method="FOO"', metrics)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_record_only_timing(self):
+        self.client.get("/")
+        metrics = self.scrape()
+        self.assertIn('yatube_request_duration_seconds_count{view="index"} 1', metrics)
+        self.assertNotIn("yatube_db_queries", metrics)
+
+
+class PostCardTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches["hot"].clear()
+        self.author = User.objects.create_user(username="writer")
+        self.group = Group.objects.create(title="Кошки", slug="cats")
+        self.post = Post.objects.create(author=self.author, text="первый текст", group=self.group)
+        self.url = f"/group/{self.group.slug}/"
+
+    def test_cards_are_cached_until_post_changes(self):
+        self.assertContains(self.client.get(self.url), "первый текст")
+        # без сдвига updated карточка берётся из кэша
+        Post.objects.filter(pk=self.post.pk).update(text="тихая правка")
+        self.assertContains(self.client.get(self.url), "первый текст")
+        self.post.text = "новый текст"
+        self.post.save()
+        self.assertContains(self.client.get(self.url), "новый текст")
+        Comment.objects.create(post=self.post, author=self.author, text="комментарий")
+        self.assertContains(self.client.get(self.url), "1 комментариев")
+
+    def test_group_title_and_author_variant(self):
+        self.client.get(self.url)
+        self.group.title = "Коты"
+        self.group.save()
+        self.assertContains(self.client.get(self.url), "#Коты")
+        self.assertNotContains(self.client.get(self.url), "Редактировать")
+        self.client.force_login(self.author)
+        self.assertContains(self.client.get(self.url), "Редактировать")
+
+
+class PageWindowTest(TestCase):
+    def test_window_around_current_page(self):
+        from django.core.paginator import Paginator
+        from .templatetags.paging import page_window
+        paginator = Paginator(range(1000), 10)
+        self.assertEqual(page_window(paginator.page(50)), [1, None, 47, 48, 49, 50, 51, 52, 53, None, 100])
+        self.assertEqual(page_window(paginator.page(1)), [1, 2, 3, 4, None, 100])
+        self.assertEqual(page_window(Paginator(range(30), 10).page(2)), [1, 2, 3])
+
+
+# TestCase держит каждый тест в транзакции, а внутри неё роутер не читает с реплики
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class ReplicaRouterTest(TransactionTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.author = User.objects.create_user(username="writer")
+        self.post = Post.objects.create(author=self.author, text="text")
+
+    def read_alias(self, request):
+        @use_replica
+        def view(request):
+            return self.router.db_for_read(Post)
+        return view(request)
+
+    def test_feeds_read_from_replica_and_writes_go_to_default(self):
+        request = RequestFactory().get("/")
+        self.assertEqual(self.read_alias(request), "replica1")
+        self.assertEqual(self.router.db_for_read(Post), "default")
+        self.assertEqual(self.router.db_for_write(Post), "default")
+        self.assertFalse(self.router.allow_migrate("replica1", "posts"))
+
+        @use_replica
+        def atomic_view(request):
+            with transaction.atomic():
+                return self.router.db_for_read(Post)
+        self.assertEqual(atomic_view(request), "default")
+
+    def test_own_write_pins_reads_to_default(self):
+        self.client.force_login(self.author)
+        self.client.post(f"/writer/{self.post.pk}/comment", {"text": "comment"})
+        request = RequestFactory().get("/")
+        request.COOKIES = {name: morsel.value for name, morsel in self.client.cookies.items()}
+        request.session = self.client.session
+        request.user = self.author
+        self.assertEqual(self.read_alias(request), "default")
+        request.session[SESSION_KEY] = 0
+        self.assertEqual(self.read_alias(request), "replica1")
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class LaggingReplicaTest(TransactionTestCase):
+    """Реплика — настоящий файл SQLite, который обновляется только copy_replicas()."""
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        connections.databases["replica1"] = {
+            "ENGINE": "django.db.backends.sqlite3", "NAME": os.path.join(self.directory.name, "replica.sqlite3"),
+        }
+        self.addCleanup(self.drop_replica)
+        self.writer = User.objects.create_user(username="writer")
+        self.client.force_login(self.writer)
+        self.copy_replicas()
+
+    def drop_replica(self):
+        connections["replica1"].close()
+        del connections["replica1"]
+        del connections.databases["replica1"]
+
+    def copy_replicas(self):
+        # как команда copy_replicas, но из тестовой базы в памяти
+        connections["replica1"].close()
+        default = connections["default"]
+        default.ensure_connection()
+        target = sqlite3.connect(connections.databases["replica1"]["NAME"])
+        try:
+            default.connection.backup(target)
+        finally:
+            target.close()
+
+    def test_own_post_is_not_hidden_by_replica_feed_cache(self):
+        self.client.post("/new/", {"text": "MY NEW POST"})
+        anonymous = Client()
+        self.assertNotContains(anonymous.get("/"), "MY NEW POST")
+        self.assertContains(self.client.get("/"), "MY NEW POST")
+        self.copy_replicas()
+        cache.clear()
+        self.assertContains(anonymous.get("/"), "MY NEW POST")
+
+    def test_replica_pages_have_no_validators(self):
+        anonymous = Client()
+        response = anonymous.get("/")
+        self.assertFalse(response.has_header("ETag"))
+        self.assertFalse(response.has_header("Last-Modified"))
+        self.client.post("/new/", {"text": "MY NEW POST"})
+        # страница до репликации не должна подтверждаться как свежая
+        stale = anonymous.get("/", HTTP_IF_NONE_MATCH="*", HTTP_IF_MODIFIED_SINCE="Sun, 01 Jan 2040 00:00:00 GMT")
+        self.assertEqual(stale.status_code, 200)
+        # писатель читает с основной базы и получает ETag
+        self.assertTrue(self.client.get("/").has_header("ETag"))
+
+
+class AsgiHandlerTest(TestCase):
+    def request(self, application, method="GET", path="/", query=b"", body=b"", headers=(), **options):
+        scope = {
+            "type": "http", "method": method, "path": path, "query_string": query,
+            "headers": [(name.encode(), value.encode()) for name, value in headers],
+            "server": ("localhost", 80), "client": ("127.0.0.1", 5000),
+        }
+        chunks = [body[:3], body[3:]]
+        messages = []
+
+        async def receive():
+            chunk = chunks.pop(0)
+            return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(AsgiHandler(application, threads=2, **options)(scope, receive, send))
+        return messages
+
+    def test_environ_and_response(self):
+        def echo(environ, start_response):
+            start_response("201 Created", [("X-Path", environ["PATH_INFO"])])
+            return [environ["QUERY_STRING"].encode(), b"|", environ["wsgi.input"].read(), b"|",
+                    environ["HTTP_X_TOKEN"].encode(), b"|", environ["CONTENT_TYPE"].encode()]
+        start, body = self.request(
+            echo, "POST", "/a/b/", b"q=1", b"text=hello",
+            [("Content-Type", "text/plain"), ("X-Token", "a"), ("X-Token", "b")],
+        )
+        self.assertEqual(start["status"], 201)
+        self.assertIn((b"x-path", b"/a/b/"), start["headers"])
+        self.assertEqual(body["body"], b"q=1|text=hello|a,b|text/plain")
+
+    def test_large_body_is_spooled_to_disk(self):
+        def echo(environ, start_response):
+            stream = environ["wsgi.input"]
+            start_response("200 OK", [])
+            return [str(stream._rolled).encode(), b"|", stream.read()]
+        data = b"x" * 5000
+        start, body = self.request(echo, "POST", body=data, spool_size=1024)
+        self.assertEqual(body["body"], b"True|" + data)
+
+    def test_body_over_limit_is_rejected(self):
+        def application(environ, start_response):
+            raise AssertionError("тело больше лимита не должно дойти до Django")
+        data = b"x" * 5000
+        start, body = self.request(
+            application, "POST", body=data, headers=[("Content-Length", "5000")], max_body_size=4096,
+        )
+        self.assertEqual(start["status"], 413)
+        # без Content-Length (chunked) лимит проверяется по прочитанному
+        start, body = self.request(application, "POST", body=data, max_body_size=4096)
+        self.assertEqual(start["status"], 413)
+
+    def test_file_response_is_streamed_in_blocks(self):
+        data = os.urandom(10000)
+        files = []
+
+        def application(environ, start_response):
+            stream = io.BytesIO(data)
+            files.append(stream)
+            response = FileResponse(stream, content_type="image/jpeg")
+            response.block_size = 4096
+            start_response("200 OK", list(response.items()))
+            return response
+        start, *bodies = self.request(application)
+        self.assertEqual(start["status"], 200)
+        self.assertEqual([len(message["body"]) for message in bodies], [4096, 4096, 1808, 0])
+        self.assertEqual([message.get("more_body", False) for message in bodies], [True, True, True, False])
+        self.assertEqual(b"".join(message["body"] for message in bodies), data)
+        self.assertTrue(files[0].closed)
+
+    def test_django_page(self):
+        from django.core.wsgi import get_wsgi_application
+        start, body = self.request(get_wsgi_application(), path="/auth/login/")
+        self.assertEqual(start["status"], 200)
+        self.assertIn("csrfmiddlewaretoken", body["body"].decode())
+
+
+class FilesServingTest(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        paths = {name: os.path.join(self.root.name, name) for name in ("source", "static", "media")}
+        os.makedirs(os.path.join(paths["source"], "css"))
+        os.makedirs(os.path.join(paths["media"], "posts", "ab"))
+        self.css = "".join(f".rule{i} {{ margin: {i}px; }}\n" for i in range(200)).encode()
+        with open(os.path.join(paths["source"], "css", "site.css"), "wb") as stream:
+            stream.write(self.css)
+        self.image_name = "posts/ab/" + "ab" * 32 + ".jpg"
+        self.image = bytes(range(256)) * 4
+        with open(os.path.join(paths["media"], self.image_name), "wb") as stream:
+            stream.write(self.image)
+        files = override_settings(
+            STATICFILES_DIRS=[paths["source"]], STATIC_ROOT=paths["static"], MEDIA_ROOT=paths["media"],
+            STATICFILES_STORAGE="yatube.staticfiles.CompressedManifestStaticFilesStorage",
+        )
+        files.enable()
+        self.addCleanup(files.disable)
+        call_command("collectstatic", interactive=False, verbosity=0)
+        self.factory = RequestFactory()
+
+    def get(self, path, **headers):
+        middleware = FilesMiddleware(lambda request: HttpResponse("страница", status=404))
+        response = middleware(self.factory.get(path, **headers))
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+    def test_media_is_immutable_and_conditional(self):
+        response, content = self.get(f"/media/{self.image_name}")
+        self.assertEqual(content, self.image)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        response, content = self.get(f"/media/{self.image_name}", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual((response.status_code, content), (304, b""))
+
+    def test_media_ranges(self):
+        url = f"/media/{self.image_name}"
+        response, content = self.get(url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual((response.status_code, content), (206, self.image[10:20]))
+        self.assertEqual(response["Content-Range"], "bytes 10-19/1024")
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertEqual(self.get(url, HTTP_RANGE="bytes=-4")[1], self.image[-4:])
+        self.assertEqual(self.get(url, HTTP_RANGE="bytes=1000-")[1], self.image[1000:])
+        self.assertEqual(self.get(url, HTTP_RANGE="bytes=5000-")[0].status_code, 416)
+        # несколько диапазонов и устаревший If-Range: весь файл
+        self.assertEqual(self.get(url, HTTP_RANGE="bytes=0-1,5-6")[1], self.image)
+        response, content = self.get(url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"old"')
+        self.assertEqual((response.status_code, content), (200, self.image))
+
+    @override_settings(MEDIA_SENDFILE="x-accel-redirect")
+    def test_media_through_nginx(self):
+        response, content = self.get(f"/media/{self.image_name}")
+        self.assertEqual(content, b"")
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.image_name}")
+
+    def test_static_is_hashed_and_precompressed(self):
+        url = CompressedManifestStaticFilesStorage().url("css/site.css")
+        self.assertRegex(url, r"^/static/css/site\.[0-9a-f]{12}\.css$")
+        response, content = self.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(gzip.decompress(content), self.css)
+        self.assertLess(len(content), len(self.css) / 4)
+        plain, content = self.get(url)
+        self.assertEqual(content, self.css)
+        self.assertNotEqual(plain["ETag"], response["ETag"])
+        # файл без хэша в имени кэшируется ненадолго
+        self.assertEqual(self.get("/static/css/site.css")[0]["Cache-Control"], "public, max-age=3600")
+
+    def test_missing_files_fall_through(self):
+        for path in ("/media/posts/missing.jpg", "/media/../secret", "/static/css/", "/posts/"):
+            response, content = self.get(path)
+            self.assertEqual((response.status_code, content.decode()), (404, "страница"))
+        # нет в манифесте: ссылка без хэша вместо ошибки шаблона
+        self.assertEqual(CompressedManifestStaticFilesStorage().url("js/missing.js"), "/static/js/missing.js")
+
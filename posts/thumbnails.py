@@ -0,0 +1,56 @@
+"""Миниатюры постов, построенные заранее.
+
+sorl строит миниатюру при первом рендере и на каждом рендере ищет её
+в своём хранилище ключей. Здесь миниатюра строится один раз после
+сохранения поста фоновой задачей, а её адрес и размеры записываются
+в сам пост, так что post_item.html выводит <img> без обращений к sorl.
+"""
+from django.utils import timezone
+from sorl.thumbnail import get_thumbnail
+
+from jobs.tasks import task
+
+from . import caching
+from .models import Post
+
+# размер и обрезка карточки в ленте
+CARD_GEOMETRY = "960x339"
+CARD_OPTIONS = {"crop": "center", "upscale": True}
+
+
+@task
+def generate(post_id):
+    """Строит миниатюру поста и сохраняет её адрес и размеры."""
+    post = Post.objects.filter(pk=post_id).only("image", "author_id").first()
+    if post is None:
+        return
+    if post.image:
+        image = get_thumbnail(post.image, CARD_GEOMETRY, **CARD_OPTIONS)
+        fields = {"thumbnail": image.url, "thumbnail_width": image.width, "thumbnail_height": image.height}
+    else:
+        fields = {"thumbnail": "", "thumbnail_width": None, "thumbnail_height": None}
+    # картинку могли заменить, пока строилась миниатюра: тогда её построит
+    # задача, поставленная при той замене
+    if Post.objects.filter(pk=post_id, image=post.image.name).update(updated=timezone.now(), **fields):
+        caching.bump(caching.POSTS_SCOPE, caching.author_scope(post.author_id))
+
+
+def save_post(form):
+    """Сохраняет PostForm; старая миниатюра сбрасывается, новая строится в фоне
+    или берётся у поста с тем же файлом."""
+    changed = "image" in form.changed_data
+    if changed:
+        form.instance.thumbnail = ""
+        form.instance.thumbnail_width = form.instance.thumbnail_height = None
+    post = form.save()
+    if changed and post.image:
+        # такую же картинку уже загружали: файл общий, и миниатюра тоже
+        ready = (
+            Post.objects.filter(image=post.image.name).exclude(thumbnail="")
+            .values("thumbnail", "thumbnail_width", "thumbnail_height").first()
+        )
+        if ready is None:
+            generate.delay(post.pk)
+        elif Post.objects.filter(pk=post.pk, image=post.image.name).update(updated=timezone.now(), **ready):
+            caching.bump(caching.POSTS_SCOPE, caching.author_scope(post.author_id))
+    return post
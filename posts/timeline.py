@@ -0,0 +1,115 @@
+"""Лента подписок с раскладкой постов при записи (fan-out-on-write).
+
+Новый пост сразу записывается в TimelineEntry каждого подписчика, и лента
+читается по индексу (user, pub_date) без перебора всех постов всех авторов.
+Авторы, у которых подписчиков больше FEED_FANOUT_LIMIT, посты не раскладывают:
+они подмешиваются в ленту при чтении, а когда подписчиков снова становится
+не больше лимита, их последние посты раскладываются задачей
+backfill_followers. Лента каждого читателя ограничена TIMELINE_LENGTH
+последними постами.
+"""
+from django.conf import settings
+from django.db.models import Q, Subquery
+
+from . import caching
+from .models import AuthorStats, Follow, Post, TimelineEntry
+
+BATCH_SIZE = 1000
+
+
+def _is_fanned_out(author_id):
+    return not AuthorStats.objects.filter(
+        user_id=author_id, followers__gt=settings.FEED_FANOUT_LIMIT,
+    ).exists()
+
+
+def trim(user_id):
+    """Оставляет в ленте читателя только TIMELINE_LENGTH последних постов."""
+    cutoff = (
+        TimelineEntry.objects.filter(user_id=user_id).order_by("-pub_date")
+        .values("pub_date")[settings.TIMELINE_LENGTH:settings.TIMELINE_LENGTH + 1]
+    )
+    TimelineEntry.objects.filter(user_id=user_id, pub_date__lte=Subquery(cutoff)).delete()
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if not _is_fanned_out(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list("user_id", flat=True)
+    batch = []
+    for user_id in followers.iterator():
+        batch.append(user_id)
+        if len(batch) == BATCH_SIZE:
+            _deliver(post, batch)
+            batch = []
+    if batch:
+        _deliver(post, batch)
+
+
+def _deliver(post, user_ids):
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=post.pk, pub_date=post.pub_date) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+    for user_id in user_ids:
+        trim(user_id)
+
+
+def _copy_posts(user_id, author_id):
+    if not _is_fanned_out(author_id):
+        return
+    posts = (
+        Post.objects.filter(author_id=author_id).order_by("-pub_date", "-pk")
+        .values_list("pk", "pub_date")[:settings.TIMELINE_LENGTH]
+    )
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date) for pk, pub_date in posts],
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту нового подписчика последние посты автора."""
+    _copy_posts(user_id, author_id)
+    trim(user_id)
+
+
+def backfill_followers(author_id):
+    """Раскладывает последние посты автора по лентам всех подписчиков.
+
+    Нужна, когда подписчиков стало не больше FEED_FANOUT_LIMIT: посты,
+    написанные сверх лимита, не разложены, а при чтении их больше
+    не подмешивают.
+    """
+    followers = Follow.objects.filter(author_id=author_id).values_list("user_id", flat=True)
+    for user_id in followers.iterator():
+        backfill(user_id, author_id)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора, от которого читатель отписался."""
+    TimelineEntry.objects.filter(user_id=user_id, post__author_id=author_id).delete()
+
+
+def rebuild(user_id):
+    """Собирает ленту читателя заново по его текущим подпискам."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    for author_id in Follow.objects.filter(user_id=user_id).values_list("author_id", flat=True):
+        _copy_posts(user_id, author_id)
+    trim(user_id)
+    # закэшированные страницы /follow/ собраны по прежней ленте
+    caching.bump(caching.reader_scope(user_id))
+
+
+def follow_feed(user):
+    """Посты ленты подписок: разложенные в TimelineEntry и посты «звёзд» на лету."""
+    entries = TimelineEntry.objects.filter(user=user).values("post_id")
+    condition = Q(pk__in=Subquery(entries))
+    popular = list(
+        Follow.objects.filter(user=user, author__stats__followers__gt=settings.FEED_FANOUT_LIMIT)
+        .values_list("author_id", flat=True)
+    )
+    if popular:
+        condition |= Q(author_id__in=popular)
+    return Post.objects.filter(condition).for_feed()
@@ -0,0 +1,255 @@
+"""Перенос данных сайта между окружениями: выгрузка и загрузка потоком.
+
+Выгружаются пользователи, группы, посты, комментарии и подписки — в этом
+порядке, чтобы при загрузке ссылки указывали на уже загруженные строки.
+Формат — JSON Lines (одна запись на строку, модель в поле "model") или
+каталог CSV-файлов, по файлу на модель. Первичные ключи сохраняются, как
+в фикстурах; строки, которые уже есть в базе, при загрузке пропускаются.
+
+Память не зависит от объёма: выгрузка читает таблицы iterator(),
+загрузка пишет пачками bulk_create, каждая пачка в своей транзакции.
+После пачки номер последней записанной строки сохраняется в файл
+контрольной точки, и прерванная загрузка продолжается с него.
+
+bulk_create не вызывает сигналы, поэтому после загрузки счётчики, ленты
+подписок и поисковый индекс пересчитываются целиком (finish()), а кэш
+очищается. Файлы картинок не переносятся: копируйте MEDIA_ROOT отдельно
+и запустите generate_thumbnails; ссылки на файлы (MediaBlob) пересчитываются.
+"""
+import contextlib
+import csv
+import datetime as dt
+import json
+import os
+import time
+
+from django.core.cache import cache, caches
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from . import blobs, counters, search, timeline
+from .models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 5000
+# как часто печатать скорость загрузки и выгрузки, секунды
+REPORT_INTERVAL = 5
+
+MODELS = {
+    "users": (User, [
+        "id", "username", "password", "first_name", "last_name", "email",
+        "is_active", "is_staff", "is_superuser", "date_joined", "last_login",
+    ]),
+    "groups": (Group, ["id", "title", "slug", "description"]),
+    "posts": (Post, ["id", "author_id", "group_id", "text", "pub_date", "updated", "image", "image_width", "image_height"]),
+    "comments": (Comment, ["id", "post_id", "author_id", "text", "created"]),
+    "follows": (Follow, ["id", "user_id", "author_id"]),
+}
+
+
+@contextlib.contextmanager
+def keep_timestamps(*models):
+    """Отключает auto_now и auto_now_add, чтобы сохранились даты из выгрузки."""
+    fields = [
+        (field, field.auto_now, field.auto_now_add)
+        for model in models for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    for field, _, _ in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Progress:
+    """Считает строки по моделям и раз в REPORT_INTERVAL секунд сообщает скорость."""
+
+    def __init__(self, report=None):
+        self.report = report or (lambda message: None)
+        self.counts = {}
+        self.started = self.reported = time.monotonic()
+
+    def add(self, name, rows):
+        self.counts[name] = self.counts.get(name, 0) + rows
+        now = time.monotonic()
+        if now - self.reported >= REPORT_INTERVAL:
+            self.reported = now
+            self.report(self.summary())
+
+    def summary(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        total = sum(self.counts.values())
+        parts = ", ".join(f"{name} {count}" for name, count in self.counts.items())
+        return f"{parts or 'нет строк'}: {total} строк за {elapsed:.1f} с, {total / elapsed:.0f} строк/с"
+
+
+def _dump(value):
+    if isinstance(value, dt.datetime):
+        return value.isoformat()
+    return value
+
+
+def records(name):
+    """Строки модели name словарями полей, по возрастанию первичного ключа."""
+    model, fields = MODELS[name]
+    rows = model.objects.order_by("pk").values_list(*fields).iterator(chunk_size=BATCH_SIZE)
+    for values in rows:
+        yield dict(zip(fields, map(_dump, values)))
+
+
+def export_jsonl(stream, progress=None):
+    progress = progress or Progress()
+    for name in MODELS:
+        written = 0
+        for row in records(name):
+            stream.write(json.dumps({"model": name, **row}, ensure_ascii=False) + "\n")
+            written += 1
+            if written == BATCH_SIZE:
+                progress.add(name, written)
+                written = 0
+        progress.add(name, written)
+    return progress
+
+
+def export_csv(directory, progress=None):
+    progress = progress or Progress()
+    os.makedirs(directory, exist_ok=True)
+    for name, (_, fields) in MODELS.items():
+        with open(os.path.join(directory, f"{name}.csv"), "w", newline="", encoding="utf-8") as stream:
+            writer = csv.DictWriter(stream, fields)
+            writer.writeheader()
+            written = 0
+            for row in records(name):
+                writer.writerow(row)
+                written += 1
+                if written == BATCH_SIZE:
+                    progress.add(name, written)
+                    written = 0
+            progress.add(name, written)
+    return progress
+
+
+def read_jsonl(path, skip=0):
+    """(номер строки, модель, поля) из файла JSON Lines; первые skip строк не разбираются."""
+    with open(path, encoding="utf-8") as stream:
+        for number, line in enumerate(stream, 1):
+            if number <= skip or not line.strip():
+                continue
+            row = json.loads(line)
+            yield number, row.pop("model"), row
+
+
+def read_csv(path, name, skip=0):
+    with open(path, newline="", encoding="utf-8") as stream:
+        for number, row in enumerate(csv.DictReader(stream), 1):
+            if number > skip:
+                yield number, name, row
+
+
+class Checkpoint:
+    """Сколько строк каждого источника уже записано в базу.
+
+    Без пути к файлу ничего не сохраняет: загрузка тогда идёт с начала,
+    а уже загруженные строки пропускаются по первичному ключу.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.done = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as stream:
+                self.done = json.load(stream)
+
+    def get(self, source):
+        return self.done.get(source, 0)
+
+    def save(self, source, line):
+        self.done[source] = line
+        if not self.path:
+            return
+        # файл заменяется целиком: при падении посреди записи остаётся прежний
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as stream:
+            json.dump(self.done, stream)
+        os.replace(temporary, self.path)
+
+
+def _converters(name):
+    model, fields = MODELS[name]
+    result = {}
+    for attname in fields:
+        field = model._meta.get_field(attname)
+
+        def convert(value, field=field):
+            # в CSV пустое значение и NULL неразличимы
+            if value in ("", None) and field.null:
+                return None
+            return field.to_python(value)
+        result[attname] = convert
+    return result
+
+
+def load(source, rows, checkpoint, progress):
+    """Записывает rows — (номер строки, модель, поля) — пачками по BATCH_SIZE.
+
+    Пачка содержит строки одной модели: при смене модели накопленное
+    записывается, чтобы сохранился порядок загрузки.
+    """
+    converters = {name: _converters(name) for name in MODELS}
+    batch, current, last = [], None, checkpoint.get(source)
+
+    def flush():
+        if not batch:
+            return
+        model = MODELS[current][0]
+        with transaction.atomic():
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+        checkpoint.save(source, last)
+        progress.add(current, len(batch))
+        batch.clear()
+
+    with keep_timestamps(Post, Comment):
+        for number, name, row in rows:
+            if name not in MODELS:
+                raise ValueError(f"{source}, строка {number}: неизвестная модель {name!r}")
+            if name != current or len(batch) >= BATCH_SIZE:
+                flush()
+                current = name
+            fields = converters[name]
+            batch.append(MODELS[name][0](**{
+                attname: fields[attname](value) for attname, value in row.items() if attname in fields
+            }))
+            last = number
+        flush()
+
+
+def import_path(path, checkpoint=None, progress=None):
+    """Загружает файл JSON Lines или каталог CSV-файлов, который сделал export_*."""
+    checkpoint = checkpoint or Checkpoint()
+    progress = progress or Progress()
+    if os.path.isdir(path):
+        for name in MODELS:
+            source = os.path.join(path, f"{name}.csv")
+            if os.path.exists(source):
+                load(source, read_csv(source, name, checkpoint.get(source)), checkpoint, progress)
+    else:
+        load(path, read_jsonl(path, checkpoint.get(path)), checkpoint, progress)
+    return progress
+
+
+def finish():
+    """Приводит в порядок то, что при загрузке делают сигналы."""
+    # явные первичные ключи не сдвигают последовательности PostgreSQL
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [model for model, _ in MODELS.values()]):
+            cursor.execute(sql)
+    counters.reconcile()
+    blobs.reconcile()
+    readers = Follow.objects.order_by().values_list("user_id", flat=True).distinct()
+    for user_id in readers.iterator():
+        timeline.rebuild(user_id)
+    search.rebuild()
+    cache.clear()
+    caches["hot"].clear()
@@ -1,63 +1,160 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.core.cache import caches
 from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
 
+from . import caching, conditional, counters, search, thumbnails, timeline
 from .forms import PostForm, CommentForm
 from .models import Group, Post, User, Comment, Follow
+from .pagination import CursorPaginator, paginate
+from yatube.routers import pin_primary, use_replica
 
+COMMENTS_PER_PAGE = 20
 
+
+def index_etag(request):
+    return conditional.page_etag(request, [caching.POSTS_SCOPE])
+
+
+def index_last_modified(request):
+    return conditional.last_modified([caching.POSTS_SCOPE], Post.objects.all())
+
+
+@use_replica
+@conditional.cache_headers
+@condition(etag_func=index_etag, last_modified_func=index_last_modified)
 def index(request):
-    post_list = Post.objects.order_by("-pub_date").all()
-    paginator = Paginator(post_list, 10) 
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
-    return render(request, "index.html", {"page": page, "paginator": paginator, "profile": profile})
+    post_list = Post.objects.for_feed()
+    return caching.render_feed(
+        request, "index.html", {}, "index", [caching.POSTS_SCOPE],
+        lambda: paginate(request, post_list, 10),
+    )
+
+
+def get_group(slug):
+    """Группа по slug из кэша горячих ключей; сбрасывается сигналами при изменении."""
+    key = f"group:{slug}"
+    group = caches["hot"].get(key)
+    if group is None:
+        group = get_object_or_404(Group, slug=slug)
+        caches["hot"].set(key, group, 60 * 60)
+    return group
+
 
+def group_etag(request, slug):
+    group = get_group(slug)
+    return conditional.page_etag(request, [caching.POSTS_SCOPE], group.title, group.description)
 
+
+def group_last_modified(request, slug):
+    return conditional.last_modified([caching.POSTS_SCOPE], Post.objects.filter(group=get_group(slug)))
+
+
+@use_replica
+@conditional.cache_headers
+@condition(etag_func=group_etag, last_modified_func=group_last_modified)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post = Post.objects.filter(group=group).order_by("-pub_date").all()
-    paginator = Paginator(post, 12)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    group = get_group(slug)
+    post = Post.objects.filter(group=group).for_feed()
+    paginator, page = paginate(request, post, 12)
     return render(request, "group.html", {"group": group, "page": page, "paginator": paginator})
 
 
+def search_posts(request):
+    query = request.GET.get("q", "").strip()
+    page = search.search(query, request.GET.get("cursor"), per_page=10)
+    return render(request, "search.html", {"query": query, "page": page})
+
+
 @login_required
 def new_post(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if request.method == "POST":
         if form.is_valid():
             form.instance.author = request.user
-            form.save()
+            thumbnails.save_post(form)
+            pin_primary(request)
             return redirect("index")
     return render(request, "new.html", {"form": form, "text_head": "Добавить запись", "text_button": "Добавить"})
 
 
+def page_author(request, username):
+    """Автор страницы: функции ETag и Last-Modified и сама вьюха берут его
+    из запроса, а не из базы каждый раз. Счётчики автора (author.stats)
+    приходят тем же запросом."""
+    author = getattr(request, "page_author", None)
+    if author is None or author.username != username:
+        author = request.page_author = get_object_or_404(User.objects.select_related("stats"), username=username)
+        counters.attach(author)
+    return author
+
+
+def profile_etag(request, username):
+    author = page_author(request, username)
+    stats = author.stats
+    return conditional.page_etag(
+        request, [caching.author_scope(author.pk)], stats.posts, stats.followers, stats.following,
+    )
+
+
+def profile_last_modified(request, username):
+    author = page_author(request, username)
+    return conditional.last_modified([caching.author_scope(author.pk)], Post.objects.filter(author=author))
+
+
+@use_replica
+@conditional.cache_headers
+@condition(etag_func=profile_etag, last_modified_func=profile_last_modified)
 def profile(request, username):
-    post_author = get_object_or_404(User, username=username)
-    profile = Post.objects.filter(author=post_author).order_by("-pub_date").all()
-    paginator = Paginator(profile, 5)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(author=post_author, user=request.user).count()   
-    else:
-        following = 0
-    count = profile.count()
-    follow_count = Follow.objects.filter(user=post_author).count()
-    f_count = Follow.objects.filter(author=post_author).count()
-    return render(request,"profile.html", {"post_author": post_author, "paginator": paginator,"page": page, "count": count, "follow_count" : follow_count, "following" : following, "f_count" : f_count}) 
+    post_author = page_author(request, username)
+    profile = Post.objects.filter(author=post_author).for_feed()
+    count = post_author.stats.posts
+    follow_count = post_author.stats.following
+    f_count = post_author.stats.followers
+    following = request.user.is_authenticated and Follow.objects.filter(author=post_author, user=request.user).exists()
+    context = {"post_author": post_author, "count": count, "follow_count" : follow_count, "following" : following, "f_count" : f_count}
+    return caching.render_feed(
+        request, "profile.html", context, "profile", [caching.author_scope(post_author.pk)],
+        lambda: paginate(request, profile, 5, count=count),
+    )
+
+
+def post_etag(request, username, post_id):
+    # комментарии и правки поста сдвигают поколение автора
+    author = page_author(request, username)
+    return conditional.page_etag(request, [caching.author_scope(author.pk)])
 
 
+def post_last_modified(request, username, post_id):
+    author = page_author(request, username)
+    return conditional.last_modified([caching.author_scope(author.pk)], Post.objects.filter(pk=post_id))
+
+
+@use_replica
+@conditional.cache_headers
+@condition(etag_func=post_etag, last_modified_func=post_last_modified)
 def post_view(request, username, post_id):
-    author = get_object_or_404(User, username=username)
-    post = get_object_or_404(Post, author=author, pk=post_id)
-    count = Post.objects.filter(author=author).count()
-    com = Comment.objects.filter(post=post)
+    author = page_author(request, username)
+    post = get_object_or_404(Post.objects.for_feed(), author=author, pk=post_id)
+    count = author.stats.posts
+    com, comments = comment_page(post, request.GET.get("comments"))
     form = CommentForm()
-    return render(request, "post.html", {"author" : author, "post": post, "count": count, "com" : com, "form" : form})
+    return render(request, "post.html", {"author" : author, "post": post, "count": count, "com" : com, "comments": comments, "form" : form})
+
+
+def comment_page(post, cursor):
+    """Комментарии поста (QuerySet) и их страница по курсору, новые сверху."""
+    com = Comment.objects.filter(post=post).select_related("author").order_by("-created", "-pk")
+    paginator = CursorPaginator(com, COMMENTS_PER_PAGE, ordering=("-created", "-pk"))
+    return com, paginator.get_page(cursor)
+
+
+def post_comments(request, username, post_id):
+    """Следующая страница комментариев фрагментом HTML для подгрузки на странице поста."""
+    post = get_object_or_404(Post.objects.select_related("author"), author__username=username, pk=post_id)
+    _, comments = comment_page(post, request.GET.get("cursor"))
+    return render(request, "comment_list.html", {"post": post, "comments": comments})
 
 
 @login_required
@@ -69,7 +166,8 @@ def post_edit(request, username, post_id):
         return redirect(post_view, username, post_id)
     if request.method == "POST":
         if form.is_valid():
-            form.save()
+            thumbnails.save_post(form)
+            pin_primary(request)
             return redirect(post_view, username, post_id)
     return render(request, "new.html", {"form": form, "id_post": id_post, "text_head": "Изменить запись", "text_button": "Сохранить"})
 
@@ -92,27 +190,29 @@ def add_comment(request, username, post_id):
             text = form.cleaned_data["text"] 
             author = request.user 
             Comment.objects.create(text=text, post=post, author=author) 
+            pin_primary(request)
             return redirect(post_view, username, post_id) 
     return render(request, "comments.html", {"form": form, "post": post}) 
      
     
+@use_replica
 @login_required
 def follow_index(request):
-    follow = Follow.objects.filter(user=request.user).values_list("author_id", flat=True)
-    count = Follow.objects.filter(user=request.user).count()
-    post_list = Post.objects.filter(author_id__in=follow).order_by("-pub_date").all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
-    return render(request, "follow.html", {"page": page, "paginator": paginator, "count": count})
+    authors = list(Follow.objects.filter(user=request.user).values_list("author_id", flat=True))
+    count = len(authors)
+    scopes = [caching.reader_scope(request.user.pk)] + [caching.author_scope(pk) for pk in authors]
+    return caching.render_feed(
+        request, "follow.html", {"count": count}, "follow", scopes,
+        lambda: paginate(request, timeline.follow_feed(request.user), 10),
+    )
 
   
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    follow = Follow.objects.filter(user=request.user, author=author)
-    if not follow.exists() and author != request.user:
-        Follow.objects.create(user=request.user, author=author)
+    if author != request.user:
+        Follow.objects.get_or_create(user=request.user, author=author)
+        pin_primary(request)
     return redirect(follow_index)
 
 
@@ -120,4 +220,5 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     post_author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=post_author).delete()
+    pin_primary(request)
     return redirect(profile, username)
@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mail
+
+from jobs.tasks import task
+
+
+User = get_user_model()
+
+
+@task(retries=5)
+def send_welcome_email(user_id):
+    user = User.objects.filter(pk=user_id).first()
+    if user is None or not user.email:
+        return
+    send_mail(
+            'Добро пожаловать в Yatube',
+            f'{user.username}, спасибо за регистрацию!',
+            'from@example.com',  # Это поле От:
+            [user.email],  # Это поле Кому:
+            fail_silently=False, # сообщать об ошибках
+    )
@@ -1,3 +1,18 @@
-from django.test import TestCase
+from django.core import mail
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from jobs.tasks import run_pending
+
+
+@override_settings(JOBS_BACKEND="database", EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class SignUpTest(TestCase):
+
+    def test_welcome_email_is_sent_by_worker(self):
+        response = self.client.post("/auth/signup/", {
+            "username": "newbie", "email": "newbie@example.com",
+            "password1": "Sup3r-secret!", "password2": "Sup3r-secret!",
+        })
+        self.assertRedirects(response, "/auth/login/")
+        self.assertEqual(len(mail.outbox), 0)
+        run_pending()
+        self.assertEqual(mail.outbox[0].to, ["newbie@example.com"])
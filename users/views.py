@@ -6,21 +6,16 @@ from django.urls import reverse_lazy
 
 #  импортируем класс формы, чтобы сослаться на неё во view-классе
 from .forms import CreationForm
-
-
-from django.core.mail import send_mail
+from .tasks import send_welcome_email
 
 
 class SignUp(CreateView):
     form_class = CreationForm
     success_url = reverse_lazy("login") #  где login — это параметр "name" в path()
     template_name = "signup.html"
-    
 
-send_mail(
-        'Тема письма',
-        'Текст письма.',
-        'from@example.com',  # Это поле От:
-        ['to@example.com'],  # Это поле Кому:
-        fail_silently=False, # сообщать об ошибках
-)
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        # письмо отправляет очередь задач, регистрация его не ждёт
+        send_welcome_email.delay(self.object.pk)
+        return response
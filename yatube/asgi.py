@@ -0,0 +1,20 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+for example for ``uvicorn yatube.asgi:application``. See yatube/asgi_handler.py.
+"""
+
+import os
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+from .asgi_handler import AsgiHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+application = AsgiHandler(
+    get_wsgi_application(), threads=settings.ASGI_THREADS,
+    max_body_size=settings.ASGI_MAX_BODY_SIZE, spool_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE,
+)
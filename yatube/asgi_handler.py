@@ -0,0 +1,170 @@
+"""ASGI-обёртка над обработчиком Django.
+
+Django 2.2 не умеет ни ASGI, ни асинхронные вьюхи, поэтому запрос
+обрабатывается обычным WSGIHandler в пуле из ASGI_THREADS потоков.
+Выигрыш — в том, что поток занят только на время работы вьюхи: тело
+запроса читается, а ответ отправляется в цикле событий, и медленные
+клиенты и открытые keep-alive соединения ждут там, не занимая потоков.
+
+Тело запроса копится в SpooledTemporaryFile: до spool_size байт
+в памяти, больше — во временном файле, как загрузки у самого Django
+(FILE_UPLOAD_MAX_MEMORY_SIZE). Тело больше max_body_size не читается
+до конца: клиент получает 413.
+
+Обычный ответ собирается в потоке пула целиком. Потоковый ответ —
+файлы из yatube/serving.py и FileResponse — читается блоками по
+block_size байт, и каждый блок отправляется клиенту отдельным сообщением:
+в памяти лежит один блок, а поток пула занят только на время чтения
+блока с диска. sendfile под ASGI нет; если картинки постов раздаёт
+веб-сервер (MEDIA_SENDFILE), Django отдаёт только заголовки.
+"""
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _latin1(value):
+    # WSGI передаёт строки как байты в latin-1
+    return value.encode("utf-8").decode("latin-1")
+
+
+def build_environ(scope, body):
+    """environ для WSGI-приложения; body — файл с телом запроса."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": _latin1(scope.get("root_path", "")),
+        "PATH_INFO": _latin1(scope["path"]),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "REMOTE_ADDR": client[0],
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{name}"
+        value = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class AsgiHandler:
+    def __init__(self, wsgi_application, threads, max_body_size=20 * 1024 * 1024, spool_size=2621440):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix="asgi")
+        self.max_body_size = max_body_size
+        self.spool_size = spool_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            raise ValueError(f"Неподдерживаемый тип соединения: {scope['type']}")
+        body = tempfile.SpooledTemporaryFile(max_size=self.spool_size)
+        try:
+            complete = await self.read_body(scope, receive, body)
+            if complete is None:
+                return
+            if not complete:
+                await self.reject(send)
+                return
+            body.seek(0)
+            loop = asyncio.get_running_loop()
+            status, headers, chunks, response = await loop.run_in_executor(
+                self.executor, self.run, build_environ(scope, body),
+            )
+            if response is not None:
+                await self.stream(status, headers, response, send)
+                return
+        finally:
+            body.close()
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"".join(chunks)})
+
+    async def stream(self, status, headers, response, send):
+        """Отправляет тело потокового ответа по блокам, читая их в пуле."""
+        loop = asyncio.get_running_loop()
+        chunks = iter(response)
+        try:
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            while True:
+                chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            # закрывает файл и тогда, когда клиент отключился посреди ответа;
+            # соединения с базой потока, где работала вьюха, проверит
+            # request_started его следующего запроса
+            await loop.run_in_executor(self.executor, response.close)
+
+    async def read_body(self, scope, receive, body):
+        """Пишет тело запроса в body. None — клиент отключился,
+        False — тело больше max_body_size."""
+        for name, value in scope.get("headers", []):
+            if name.lower() == b"content-length" and value.isdigit() and int(value) > self.max_body_size:
+                return False
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            # Content-Length может не быть (chunked) или он может быть неверным
+            if size > self.max_body_size:
+                return False
+            body.write(chunk)
+            if not message.get("more_body"):
+                return True
+
+    async def reject(self, send):
+        await send({
+            "type": "http.response.start", "status": 413,
+            "headers": [(b"content-type", b"text/plain; charset=utf-8"), (b"connection", b"close")],
+        })
+        await send({"type": "http.response.body", "body": b"Request Entity Too Large"})
+
+    def run(self, environ):
+        """Выполняет запрос в потоке пула: (статус, заголовки, тело, None)
+        или для потокового ответа (статус, заголовки, None, ответ)."""
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = [
+                (name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers
+            ]
+        response = self.wsgi_application(environ, start_response)
+        if getattr(response, "streaming", False):
+            return started["status"], started["headers"], None, response
+        try:
+            chunks = list(response)
+        finally:
+            # request_finished закрывает соединения с базой этого потока
+            if hasattr(response, "close"):
+                response.close()
+        return started["status"], started["headers"], chunks, None
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
@@ -0,0 +1,88 @@
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import metrics
+
+
+class TieredCache(BaseCache):
+    """Двухуровневый кэш для горячих ключей.
+
+    L1 — память процесса с коротким сроком жизни, L2 — общий для всех
+    воркеров кэш (алиас из OPTIONS["SHARED"]). Чтение сначала идёт в L1,
+    запись и удаление — в оба уровня. Удаление в одном процессе не видно
+    в L1 других, поэтому там значение может отставать на LOCAL_TIMEOUT
+    секунд: ключи поколений и всё, что должно меняться мгновенно, сюда
+    класть нельзя.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.shared_alias = options.get("SHARED", "default")
+        self.local_timeout = options.get("LOCAL_TIMEOUT", 5)
+        self.local = LocMemCache(f"tiered-{location}", {
+            "TIMEOUT": self.local_timeout,
+            "OPTIONS": {"MAX_ENTRIES": options.get("LOCAL_MAX_ENTRIES", 1000)},
+        })
+        self.stats = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _local_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        value = self.local.get(key, self)
+        if value is not self:
+            self.stats["local_hits"] += 1
+            metrics.cache_result("hot", True)
+            return value
+        value = self.shared.get(key, self)
+        metrics.cache_result("hot", value is not self)
+        if value is self:
+            self.stats["misses"] += 1
+            return default
+        self.stats["shared_hits"] += 1
+        self.local.set(key, value, self.local_timeout)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.shared.set(key, value, timeout)
+        self.local.set(key, value, self._local_timeout(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        if not self.shared.add(key, value, timeout):
+            return False
+        self.local.set(key, value, self._local_timeout(timeout))
+        return True
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.local.delete(key)
+        self.shared.delete(key)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.local.touch(key, self._local_timeout(timeout))
+        return self.shared.touch(key, timeout)
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.local.delete(key)
+        return self.shared.incr(key, delta)
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        return self.local.has_key(key) or self.shared.has_key(key)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
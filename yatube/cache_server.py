@@ -0,0 +1,172 @@
+"""Локальный сервер кэша с текстовым протоколом memcached.
+
+Заменяет настоящий memcached при разработке и в бенчмарках: несколько
+процессов runserver/gunicorn получают общий кэш без внешних сервисов.
+
+    python -m yatube.cache_server --port 11211
+    YATUBE_CACHE=memcached python manage.py runserver
+
+Поддерживаются команды, которыми пользуется бэкенд Django:
+get/gets, set/add/replace/append/prepend, delete, incr/decr, touch,
+flush_all, stats, version, quit. Вытеснение — LRU по числу ключей.
+"""
+import argparse
+import asyncio
+import time
+from collections import OrderedDict
+
+# exptime больше 30 суток memcached считает абсолютным unix-временем
+RELATIVE_EXPTIME_LIMIT = 60 * 60 * 24 * 30
+
+
+class Store:
+    def __init__(self, max_items=100000):
+        self.max_items = max_items
+        self.items = OrderedDict()
+        self.stats = {"get_hits": 0, "get_misses": 0, "evictions": 0}
+
+    @staticmethod
+    def deadline(exptime):
+        exptime = int(exptime)
+        if exptime == 0:
+            return None
+        if exptime < 0:
+            return 0
+        if exptime <= RELATIVE_EXPTIME_LIMIT:
+            return time.time() + exptime
+        return exptime
+
+    def get(self, key, count=True):
+        item = self.items.get(key)
+        if item is not None and item[2] is not None and item[2] <= time.time():
+            del self.items[key]
+            item = None
+        if count:
+            self.stats["get_hits" if item is not None else "get_misses"] += 1
+        if item is None:
+            return None
+        self.items.move_to_end(key)
+        return item
+
+    def put(self, key, flags, exptime, data):
+        self.items[key] = (flags, data, self.deadline(exptime))
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_items:
+            self.items.popitem(last=False)
+            self.stats["evictions"] += 1
+
+
+class Protocol:
+    STORAGE = {"set", "add", "replace", "append", "prepend"}
+
+    def __init__(self, store):
+        self.store = store
+
+    def store_command(self, command, key, flags, exptime, data):
+        existing = self.store.get(key, count=False)
+        if command == "add" and existing is not None:
+            return b"NOT_STORED"
+        if command in ("replace", "append", "prepend") and existing is None:
+            return b"NOT_STORED"
+        if command == "append":
+            flags, exptime, data = existing[0], 0, existing[1] + data
+        elif command == "prepend":
+            flags, exptime, data = existing[0], 0, data + existing[1]
+        self.store.put(key, flags, exptime, data)
+        return b"STORED"
+
+    def command(self, parts):
+        name, args = parts[0].decode().lower(), [part.decode() for part in parts[1:]]
+        if name in ("get", "gets"):
+            lines = []
+            for key in args:
+                item = self.store.get(key)
+                if item is not None:
+                    cas = f" {id(item)}" if name == "gets" else ""
+                    lines.append(f"VALUE {key} {item[0]} {len(item[1])}{cas}".encode())
+                    lines.append(item[1])
+            return b"\r\n".join(lines + [b"END"])
+        if name == "delete":
+            return b"DELETED" if self.store.items.pop(args[0], None) is not None else b"NOT_FOUND"
+        if name in ("incr", "decr"):
+            item = self.store.get(args[0], count=False)
+            if item is None:
+                return b"NOT_FOUND"
+            try:
+                value = int(item[1])
+            except ValueError:
+                return b"CLIENT_ERROR cannot increment or decrement non-numeric value"
+            value = value + int(args[1]) if name == "incr" else max(value - int(args[1]), 0)
+            self.store.items[args[0]] = (item[0], str(value).encode(), item[2])
+            return str(value).encode()
+        if name == "touch":
+            item = self.store.get(args[0], count=False)
+            if item is None:
+                return b"NOT_FOUND"
+            self.store.items[args[0]] = (item[0], item[1], self.store.deadline(args[1]))
+            return b"TOUCHED"
+        if name == "flush_all":
+            self.store.items.clear()
+            return b"OK"
+        if name == "version":
+            return b"VERSION yatube-1.0"
+        if name == "stats":
+            stats = dict(self.store.stats, curr_items=len(self.store.items))
+            return b"\r\n".join([f"STAT {k} {v}".encode() for k, v in stats.items()] + [b"END"])
+        return b"ERROR"
+
+
+async def handle(reader, writer, protocol):
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            parts = line.split()
+            if not parts:
+                continue
+            name = parts[0].decode().lower()
+            if name == "quit":
+                break
+            noreply = parts[-1] == b"noreply"
+            if noreply:
+                parts = parts[:-1]
+            try:
+                if name in Protocol.STORAGE:
+                    key, flags, exptime, size = parts[1].decode(), int(parts[2]), int(parts[3]), int(parts[4])
+                    data = (await reader.readexactly(size + 2))[:-2]
+                    response = protocol.store_command(name, key, flags, exptime, data)
+                else:
+                    response = protocol.command(parts)
+            except (IndexError, ValueError):
+                response = b"CLIENT_ERROR bad command line format"
+            if not noreply:
+                writer.write(response + b"\r\n")
+                await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host, port, max_items):
+    protocol = Protocol(Store(max_items))
+    server = await asyncio.start_server(lambda r, w: handle(r, w, protocol), host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11211)
+    parser.add_argument("--max-items", type=int, default=100000)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_items))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Метрики запросов в памяти процесса, отдаваемые в формате Prometheus.
+
+MetricsMiddleware для каждого запроса записывает время ответа и статус
+по имени сработавшего URL. Часть запросов (METRICS_SAMPLE_RATE) разбирается
+подробнее: сколько было запросов к базе и сколько они заняли, сколько
+времени рендерились шаблоны, сколько было попаданий и промахов кэша лент
+и горячего кэша. Замеры складываются в гистограммы с фиксированными
+корзинами, поэтому память не растёт с числом запросов.
+
+Метрики отдаёт metrics_view по заголовку Authorization: Bearer METRICS_TOKEN
+или сотруднику сайта. Каждый процесс считает свои запросы, и Prometheus
+должен опрашивать воркеры по отдельности.
+"""
+import bisect
+import contextlib
+import contextvars
+import hmac
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template import base
+
+# корзины гистограмм: секунды и штуки
+SECONDS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNTS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+# метод приходит от клиента: прочие глаголы сводятся в "other",
+# иначе каждый выдуманный метод заводил бы новую серию
+METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+METRICS = {
+    "yatube_requests_total": ("counter", "Ответы по view, методу и статусу", None),
+    "yatube_request_duration_seconds": ("histogram", "Время ответа", SECONDS),
+    "yatube_sampled_requests_total": ("counter", "Запросы, разобранные подробно", None),
+    "yatube_db_queries": ("histogram", "Запросов к базе на ответ", COUNTS),
+    "yatube_db_duration_seconds": ("histogram", "Время запросов к базе на ответ", SECONDS),
+    "yatube_template_render_seconds": ("histogram", "Время рендеринга шаблонов на ответ", SECONDS),
+    "yatube_cache_requests_total": ("counter", "Чтения кэша по результату", None),
+}
+
+# подробности текущего запроса, если он попал в выборку
+_sample = contextvars.ContextVar("metrics_sample", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Счётчики и гистограммы по имени метрики и набору меток."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def _get(self, name, labels):
+        kind, _, buckets = METRICS[name]
+        series = self.values.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        if key not in series:
+            series[key] = Histogram(buckets) if kind == "histogram" else 0
+        return series, key
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            series, key = self._get(name, labels)
+            series[key] += value
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            series, key = self._get(name, labels)
+            series[key].observe(value)
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, series in self.values.items():
+                kind, help_text, buckets = METRICS[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(series.items()):
+                    if kind == "counter":
+                        lines.append(f"{name}{_labels(key)} {value}")
+                        continue
+                    total = 0
+                    for bound, count in zip(list(buckets) + ["+Inf"], value.counts):
+                        total += count
+                        lines.append(f"{name}_bucket{_labels(key + (('le', str(bound)),))} {total}")
+                    lines.append(f"{name}_sum{_labels(key)} {value.sum:.6f}")
+                    lines.append(f"{name}_count{_labels(key)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+registry = Registry()
+
+
+def cache_result(cache, hit):
+    """Отмечает чтение кэша cache в подробно разбираемом запросе."""
+    sample = _sample.get()
+    if sample is not None:
+        result = "hit" if hit else "miss"
+        sample["cache"][cache, result] = sample["cache"].get((cache, result), 0) + 1
+
+
+_original_render = base.Template.render
+
+
+def _timed_render(self, context):
+    sample = _sample.get()
+    # вложенные шаблоны ({% include %}, {% extends %}) уже внутри внешнего замера
+    if sample is None or sample["depth"]:
+        return _original_render(self, context)
+    sample["depth"] += 1
+    started = time.perf_counter()
+    try:
+        return _original_render(self, context)
+    finally:
+        sample["templates"] += time.perf_counter() - started
+        sample["depth"] -= 1
+
+
+def _timed_query(execute, sql, params, many, context):
+    sample = _sample.get()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample["queries"] += 1
+        sample["db"] += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        base.Template.render = _timed_render
+
+    def __call__(self, request):
+        sampled = random.random() < settings.METRICS_SAMPLE_RATE
+        sample = {"queries": 0, "db": 0.0, "templates": 0.0, "depth": 0, "cache": {}} if sampled else None
+        token = _sample.set(sample)
+        started = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                if sampled:
+                    for connection in connections.all():
+                        stack.enter_context(connection.execute_wrapper(_timed_query))
+                response = self.get_response(request)
+        finally:
+            _sample.reset(token)
+        elapsed = time.perf_counter() - started
+        match = getattr(request, "resolver_match", None)
+        view = {"view": match.view_name if match else "unresolved"}
+        method = request.method if request.method in METHODS else "other"
+        registry.inc("yatube_requests_total", dict(view, method=method, status=response.status_code))
+        registry.observe("yatube_request_duration_seconds", view, elapsed)
+        if sampled:
+            registry.inc("yatube_sampled_requests_total", view)
+            registry.observe("yatube_db_queries", view, sample["queries"])
+            registry.observe("yatube_db_duration_seconds", view, sample["db"])
+            registry.observe("yatube_template_render_seconds", view, sample["templates"])
+            for (cache, result), count in sample["cache"].items():
+                registry.inc("yatube_cache_requests_total", dict(view, cache=cache, result=result), count)
+        return response
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    allowed = bool(token) and hmac.compare_digest(header, f"Bearer {token}")
+    if not (allowed or request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
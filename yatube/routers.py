@@ -0,0 +1,70 @@
+"""Чтение лент с реплик базы.
+
+Вьюхи лент, помеченные @use_replica, читают со случайной реплики из
+DATABASE_REPLICAS; всё остальное, запись и чтение внутри транзакции идут
+в default. Реплика отстаёт от основной базы, поэтому после собственной
+записи (pin_primary) пользователь REPLICA_PIN_SECONDS секунд читает
+с основной базы и сразу видит свой пост или комментарий. Метка хранится
+в сессии и работает во всех воркерах.
+
+Локально репликой может быть копия файла SQLite: см. YATUBE_REPLICA_PATHS
+в настройках и команду copy_replicas.
+"""
+import contextvars
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SESSION_KEY = "primary_until"
+
+_replica = contextvars.ContextVar("use_replica", default=False)
+
+
+def reading_replica():
+    """Читает ли текущий запрос с реплики."""
+    return _replica.get() and bool(settings.DATABASE_REPLICAS)
+
+
+def pin_primary(request):
+    """После записи пользователь какое-то время читает с основной базы."""
+    if settings.DATABASE_REPLICAS and hasattr(request, "session"):
+        request.session[SESSION_KEY] = time.time() + settings.REPLICA_PIN_SECONDS
+
+
+def use_replica(view):
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        pinned = False
+        # сессия и пользователь читаются с основной базы: только что
+        # зарегистрированного пользователя на реплике может ещё не быть;
+        # сессию анонима без cookie не нужно загружать вовсе
+        if settings.DATABASE_REPLICAS and settings.SESSION_COOKIE_NAME in request.COOKIES:
+            pinned = request.session.get(SESSION_KEY, 0) > time.time()
+            request.user.is_authenticated
+        token = _replica.set(not pinned)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not reading_replica() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # на репликах те же строки, что в основной базе
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # схема реплик приходит из основной базы
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,206 @@
+"""Раздача статики и картинок постов на боевом сервере.
+
+В разработке файлы отдаёт django.views.static.serve из yatube/urls.py:
+каждый байт проходит через все middleware и URLconf. FilesMiddleware
+стоит первым и отвечает на STATIC_URL и MEDIA_URL сам, не трогая сессию,
+пользователя и метрики страниц:
+
+- файлы с хэшем в имени (статика из yatube.staticfiles, картинки постов
+  из posts/storage.py) отдаются с Cache-Control: immutable на год,
+  остальные — на FILES_MAX_AGE секунд;
+- ETag и Last-Modified: повторный запрос получает 304 без тела;
+- Range: плеер или докачка получают нужный кусок ответом 206;
+- статика отдаётся заранее сжатой копией .br или .gz, если её принимает
+  браузер;
+- тело ответа — файл, и WSGI-сервер с wsgi.file_wrapper (gunicorn)
+  передаёт его через sendfile; yatube.asgi отправляет его блоками по
+  BLOCK_SIZE, не читая в память целиком, но без sendfile.
+
+Если перед Django стоит nginx, картинки постов лучше отдавать им: при
+MEDIA_SENDFILE = "x-accel-redirect" ответ содержит только заголовки
+и X-Accel-Redirect: MEDIA_ACCEL_PREFIX + путь, а файл читает nginx::
+
+    location /protected-media/ {
+        internal;
+        alias /srv/yatube/media/;
+    }
+
+"x-sendfile" делает то же для Apache (mod_xsendfile) и lighttpd: в
+заголовке X-Sendfile передаётся путь к файлу на диске.
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, HttpResponseNotAllowed, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+YEAR = 60 * 60 * 24 * 365
+BLOCK_SIZE = 64 * 1024
+# bootstrap.min.3f2a9c81d0e4.css — имя из манифеста ManifestStaticFilesStorage
+HASHED_STATIC = re.compile(r"\.[0-9a-f]{12}\.\w+$")
+# картинка поста под хэшем содержимого, см. posts/storage.py
+HASHED_MEDIA = re.compile(r"^[0-9a-f]{64}(\.\w+)?$")
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+# заранее сжатые копии статики в порядке предпочтения
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+
+class _Slice:
+    """Часть файла для ответа 206: read() не выходит за конец диапазона."""
+
+    def __init__(self, stream, start, length):
+        stream.seek(start)
+        self.stream = stream
+        self.left = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.left:
+            size = self.left
+        data = self.stream.read(size)
+        self.left -= len(data)
+        return data
+
+    def close(self):
+        self.stream.close()
+
+
+def _byte_range(header, size):
+    """(начало, длина) из заголовка Range; None — отдать файл целиком,
+    False — диапазон за концом файла. Несколько диапазонов не поддерживаются,
+    и на них, как разрешает RFC 7233, отдаётся весь файл."""
+    match = RANGE.match(header.replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        # bytes=-500: последние 500 байт
+        length = min(int(last), size)
+        return (size - length, length) if length else False
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        return False
+    if end < start:
+        return None
+    return start, end - start + 1
+
+
+def _cache_control(kind, path):
+    name = os.path.basename(path)
+    immutable = HASHED_STATIC.search(name) if kind == "static" else HASHED_MEDIA.match(name)
+    if immutable:
+        return f"public, max-age={YEAR}, immutable"
+    return f"public, max-age={settings.FILES_MAX_AGE}"
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if if_none_match is not None:
+        return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+    since = parse_http_date_safe(request.META.get("HTTP_IF_MODIFIED_SINCE", ""))
+    return since is not None and int(mtime) <= since
+
+
+def _precompressed(request, fullpath):
+    """(кодировка, путь) заранее сжатой копии, которую принимает браузер."""
+    accepted = request.META.get("HTTP_ACCEPT_ENCODING", "")
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted and os.path.isfile(fullpath + suffix):
+            return encoding, fullpath + suffix
+    return None, fullpath
+
+
+def serve(request, kind, path, root):
+    """Ответ с файлом path из каталога root; None, если такого файла нет."""
+    try:
+        fullpath = safe_join(root, path)
+        stats = os.stat(fullpath)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        return None
+    if not stat.S_ISREG(stats.st_mode):
+        return None
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+
+    requested = request.META.get("HTTP_RANGE")
+    encoding, sent = None, fullpath
+    if kind == "static" and not requested:
+        encoding, sent = _precompressed(request, fullpath)
+    # у сжатой копии свой ETag: это другое представление того же файла
+    etag = f'"{stats.st_size:x}-{int(stats.st_mtime):x}{"-" + encoding if encoding else ""}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(stats.st_mtime),
+        "Cache-Control": _cache_control(kind, path),
+        "X-Content-Type-Options": "nosniff",
+    }
+    if kind == "static":
+        headers["Vary"] = "Accept-Encoding"
+    if _not_modified(request, etag, stats.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        content_type, file_encoding = mimetypes.guess_type(fullpath)
+        # файл, который сам по себе архив (.gz, .bz2), браузер получает как есть
+        content_type = "application/octet-stream" if file_encoding else content_type or "application/octet-stream"
+        if kind == "media" and settings.MEDIA_SENDFILE:
+            response = HttpResponse(content_type=content_type)
+            if settings.MEDIA_SENDFILE == "x-accel-redirect":
+                response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX + quote(path)
+            else:
+                response["X-Sendfile"] = fullpath
+        else:
+            response = _file_response(request, sent, stats.st_size, content_type, etag)
+            if encoding:
+                response["Content-Encoding"] = encoding
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def _file_response(request, path, size, content_type, etag):
+    requested = request.META.get("HTTP_RANGE")
+    if_range = request.META.get("HTTP_IF_RANGE")
+    # If-Range с другим ETag: файл сменился, кусок старой версии не нужен
+    byte_range = None
+    if requested and (if_range is None or if_range == etag):
+        byte_range = _byte_range(requested, size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+    elif byte_range is not None:
+        start, length = byte_range
+        response = FileResponse(_Slice(open(path, "rb"), start, length), status=206, content_type=content_type)
+        response["Content-Length"] = length
+        response["Content-Range"] = f"bytes {start}-{start + length - 1}/{size}"
+    else:
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+    response["Accept-Ranges"] = "bytes"
+    response.block_size = BLOCK_SIZE
+    return response
+
+
+class FilesMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # адреса вида https://cdn.example.com/ раздаёт не Django
+        self.roots = [
+            (prefix, kind, root) for prefix, kind, root in (
+                (settings.STATIC_URL, "static", settings.STATIC_ROOT),
+                (settings.MEDIA_URL, "media", settings.MEDIA_ROOT),
+            ) if prefix and prefix.startswith("/") and root
+        ]
+
+    def __call__(self, request):
+        for prefix, kind, root in self.roots:
+            if request.path_info.startswith(prefix):
+                response = serve(request, kind, request.path_info[len(prefix):], root)
+                if response is not None:
+                    return response
+        # несуществующий файл получает обычную страницу 404
+        return self.get_response(request)
@@ -38,7 +38,8 @@ ALLOWED_HOSTS = [
 
 INSTALLED_APPS = [
     'users',
-    'posts',
+    'posts.apps.PostsConfig',
+    'jobs.apps.JobsConfig',
     "django.contrib.sites",
     "django.contrib.flatpages",
     'django.contrib.admin',
@@ -52,6 +53,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # первым, чтобы время ответа включало остальные middleware
+    'yatube.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,6 +87,11 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+# потоки, в которых yatube.asgi выполняет запросы
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', '8'))
+# самое большое тело запроса в yatube.asgi, больше — ответ 413;
+# с запасом вмещает картинку поста до обработки (posts/images.py)
+ASGI_MAX_BODY_SIZE = int(os.environ.get('ASGI_MAX_BODY_SIZE', str(20 * 1024 * 1024)))
 
 
 # Database
@@ -95,6 +103,20 @@ DATABASES = {
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
     }
 }
+# реплики для чтения лент, см. yatube/routers.py; локально — копии файла
+# базы через запятую, обновляются командой copy_replicas
+DATABASE_REPLICAS = []
+for number, path in enumerate(filter(None, os.environ.get('YATUBE_REPLICA_PATHS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        # в тестах реплика — та же тестовая база
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['yatube.routers.ReplicaRouter']
+# сколько секунд после своей записи пользователь читает с основной базы
+REPLICA_PIN_SECONDS = 10
 
 
 # Password validation
@@ -138,6 +160,20 @@ STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+# статика и картинки на боевом сервере, см. yatube/serving.py: сколько
+# секунд браузер хранит файл без хэша в имени; файлы с хэшем — год
+FILES_MAX_AGE = 60 * 60
+# "x-accel-redirect" (nginx) или "x-sendfile" (Apache, lighttpd): картинки
+# отдаёт веб-сервер, Django присылает только заголовки
+MEDIA_SENDFILE = ''
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# картинки постов перекодируются при загрузке, см. posts/images.py:
+# JPEG (прогрессивный) или WEBP, большая сторона не длиннее POST_IMAGE_MAX_SIDE
+POST_IMAGE_FORMAT = os.environ.get('POST_IMAGE_FORMAT', 'JPEG')
+POST_IMAGE_QUALITY = 82
+POST_IMAGE_MAX_SIDE = 2048
+# картинки больше этого числа пикселей не декодируются вовсе
+POST_IMAGE_MAX_PIXELS = 50 * 10 ** 6
 LOGIN_URL = "/auth/login/"
 LOGIN_REDIRECT_URL = "index" 
 LOGOUT_REDIRECT_URL = "index"
@@ -145,11 +181,66 @@ LOGOUT_REDIRECT_URL = "index"
 EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 # указываем директорию, в которую будут складываться файлы писем
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
-CACHES = {
-        'default': {
+# общий для всех воркеров кэш выбирается переменной окружения YATUBE_CACHE:
+# locmem (по умолчанию, только для одного процесса), file, memcached, redis.
+# для memcached нужен пакет python-memcached, redis — django-redis;
+# вместо memcached локально подходит python -m yatube.cache_server
+CACHE_BACKENDS = {
+        'locmem': {
                 'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        }
+                'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+        'file': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': os.environ.get(
+                        'YATUBE_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+                'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+        'memcached': {
+                'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+                'LOCATION': os.environ.get('YATUBE_CACHE_LOCATION', '127.0.0.1:11211'),
+        },
+        'redis': {
+                'BACKEND': 'django_redis.cache.RedisCache',
+                'LOCATION': os.environ.get(
+                        'YATUBE_CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+        },
+}
+CACHES = {
+        'default': CACHE_BACKENDS[os.environ.get('YATUBE_CACHE', 'locmem')],
+        # горячие ключи (группы): память процесса поверх default
+        'hot': {
+                'BACKEND': 'yatube.cache.TieredCache',
+                'OPTIONS': {'SHARED': 'default', 'LOCAL_TIMEOUT': 5},
+        },
 }
+# ленты инвалидируются по событиям, срок жизни нужен только для вытеснения
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+# ленту, прочитанную с реплики, можно построить по отставшим данным уже
+# под новым номером поколения: такие записи живут недолго
+REPLICA_FEED_CACHE_TIMEOUT = 30
+# авторы с большим числом подписчиков не раскладывают посты по лентам,
+# их посты подмешиваются в ленту подписок при чтении
+FEED_FANOUT_LIMIT = 1000
+# сколько последних постов хранится в ленте подписок одного читателя
+TIMELINE_LENGTH = 800
+# очередь фоновых задач, см. jobs/tasks.py: immediate, thread или database;
+# с database задачи выполняет python manage.py run_jobs
+JOBS_BACKEND = os.environ.get('JOBS_BACKEND', 'immediate')
+# пауза перед повтором упавшей задачи растёт квадратично от этой величины
+JOBS_RETRY_DELAY = 10
+# задача, которую воркер не закончил за это время, возвращается в очередь
+JOBS_LOCK_TIMEOUT = 60 * 10
+# движок поиска, см. posts/search.py: auto выбирает FTS5, если таблица есть
+SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'auto')
+# доля запросов, для которых yatube.metrics считает запросы к базе,
+# рендеринг шаблонов и чтения кэша; время ответа пишется для всех
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', '0.1'))
+# токен для /metrics/ (Authorization: Bearer ...); пустой — только сотрудникам
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# сколько секунд общие кэши (прокси) могут отдавать анонимам страницы
+# без перепроверки, см. posts/conditional.py
+HTML_CACHE_MAX_AGE = 60
 INTERNAL_IPS = [
         "127.0.0.1",
 ]
\ No newline at end of file
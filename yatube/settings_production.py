@@ -0,0 +1,96 @@
+"""Настройки боевого сервера: всё, что отличается от разработки.
+
+    DJANGO_SETTINGS_MODULE=yatube.settings_production
+
+Значения берутся из переменных окружения. SECRET_KEY обязателен;
+YATUBE_ALLOWED_HOSTS — имена хостов через запятую. База по умолчанию —
+SQLite в режиме WAL с постоянными соединениями; если задана POSTGRES_DB,
+используется PostgreSQL (нужен пакет psycopg2).
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, CACHE_BACKENDS, CACHES, INSTALLED_APPS, MIDDLEWARE, TEMPLATES
+
+DEBUG = os.environ.get('DJANGO_DEBUG') == '1'
+SECRET_KEY = os.environ['SECRET_KEY']
+ALLOWED_HOSTS = [host for host in os.environ.get('YATUBE_ALLOWED_HOSTS', '').split(',') if host]
+
+# панель отладки нужна только при разработке
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app != 'debug_toolbar']
+MIDDLEWARE = [name for name in MIDDLEWARE if not name.startswith('debug_toolbar.')]
+INTERNAL_IPS = []
+
+# соединение живёт между запросами воркера, а не открывается на каждый
+CONN_MAX_AGE = int(os.environ.get('YATUBE_CONN_MAX_AGE', '600'))
+
+if os.environ.get('POSTGRES_DB'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ['POSTGRES_DB'],
+            'USER': os.environ.get('POSTGRES_USER', ''),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', ''),
+            'PORT': os.environ.get('POSTGRES_PORT', ''),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'yatube.sqlite',
+            'NAME': os.environ.get('YATUBE_SQLITE_PATH', os.path.join(BASE_DIR, 'db.sqlite3')),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'OPTIONS': {
+                # сколько секунд запрос ждёт блокировку, прежде чем упасть
+                'timeout': 20,
+                'begin': 'IMMEDIATE',
+                'pragmas': {
+                    # читатели не ждут писателя, писатель не ждёт читателей
+                    'journal_mode': 'WAL',
+                    # в WAL fsync только на контрольных точках: коммит не теряет
+                    # целостность, при отключении питания теряются последние коммиты
+                    'synchronous': 'NORMAL',
+                    'mmap_size': 256 * 1024 * 1024,
+                    # отрицательное значение — в килобайтах
+                    'cache_size': -64 * 1024,
+                    'temp_store': 'MEMORY',
+                },
+            },
+        }
+    }
+
+# реплики для чтения лент: хосты PostgreSQL или копии файла SQLite
+# через запятую, см. yatube/routers.py
+DATABASE_REPLICAS = []
+_replicas = os.environ.get('POSTGRES_REPLICA_HOSTS' if os.environ.get('POSTGRES_DB') else 'YATUBE_REPLICA_PATHS', '')
+for _number, _location in enumerate(filter(None, _replicas.split(',')), 1):
+    _key = 'HOST' if os.environ.get('POSTGRES_DB') else 'NAME'
+    DATABASES[f'replica{_number}'] = dict(DATABASES['default'], **{_key: _location, 'TEST': {'MIRROR': 'default'}})
+    DATABASE_REPLICAS.append(f'replica{_number}')
+
+# шаблоны читаются и компилируются один раз на процесс
+TEMPLATES = [dict(TEMPLATES[0], APP_DIRS=False)]
+TEMPLATES[0]['OPTIONS'] = dict(TEMPLATES[0]['OPTIONS'], debug=False, loaders=[
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+])
+
+# статика собирается под именами с хэшем и заранее сжимается; её
+# и картинки постов отдаёт FilesMiddleware до остальных middleware
+STATICFILES_STORAGE = 'yatube.staticfiles.CompressedManifestStaticFilesStorage'
+MIDDLEWARE = ['yatube.serving.FilesMiddleware'] + MIDDLEWARE
+# за nginx: YATUBE_MEDIA_SENDFILE=x-accel-redirect, см. yatube/serving.py
+MEDIA_SENDFILE = os.environ.get('YATUBE_MEDIA_SENDFILE', '')
+MEDIA_ACCEL_PREFIX = os.environ.get('YATUBE_MEDIA_ACCEL_PREFIX', '/protected-media/')
+
+# у нескольких воркеров кэш должен быть общим: в LocMemCache каждого
+# процесса свои номера поколений, и ленты не инвалидировались бы
+CACHES = dict(CACHES, default=CACHE_BACKENDS[os.environ.get('YATUBE_CACHE', 'file')])
+# побочные эффекты записи выполняет python manage.py run_jobs
+JOBS_BACKEND = os.environ.get('JOBS_BACKEND', 'database')
+
+SESSION_COOKIE_SECURE = CSRF_COOKIE_SECURE = os.environ.get('YATUBE_HTTPS') == '1'
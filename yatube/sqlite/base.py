@@ -0,0 +1,31 @@
+"""SQLite с настройками соединения для нескольких воркеров.
+
+Бэкенд понимает два дополнительных ключа в DATABASES[...]["OPTIONS"]:
+
+* ``pragmas`` — словарь PRAGMA, которые выполняются на каждом новом
+  соединении (journal_mode=WAL, synchronous, mmap_size...);
+* ``begin`` — режим транзакций Django: ``IMMEDIATE`` берёт блокировку
+  записи в начале atomic(), и пишущий запрос ждёт busy timeout, а не падает
+  с «database is locked», когда его чтение внутри транзакции устарело.
+
+Остальные OPTIONS, как и у встроенного бэкенда, уходят в sqlite3.connect.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop("pragmas", None)
+        params.pop("begin", None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict["OPTIONS"].get("pragmas", {}).items():
+            connection.execute(f"PRAGMA {name} = {value}")
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        begin = self.settings_dict["OPTIONS"].get("begin")
+        self.cursor().execute(f"BEGIN {begin}" if begin else "BEGIN")
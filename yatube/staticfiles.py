@@ -0,0 +1,70 @@
+"""Хранилище статики для боевого сервера: имена с хэшем и сжатые копии.
+
+collectstatic кладёт каждый файл ещё и под именем с хэшем содержимого
+(bootstrap.min.3f2a….css), а {% static %} подставляет это имя из
+staticfiles.json. Такой адрес меняется вместе с файлом, поэтому
+yatube.serving отдаёт его с Cache-Control: immutable на год.
+
+Текстовые файлы (CSS, JS, SVG…) сжимаются заранее: рядом с файлом
+появляются .gz и, если установлен пакет brotli, .br. Сжатие с наибольшей
+степенью делается один раз при сборке, а не на каждом ответе.
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli необязателен
+    brotli = None
+
+COMPRESSIBLE = (".css", ".js", ".map", ".svg", ".txt", ".html", ".json", ".xml", ".ico", ".eot", ".ttf")
+# маленькие файлы сжатие почти не уменьшает
+MIN_SIZE = 512
+
+
+def _gzip(data):
+    # mtime=0: одинаковый файл при каждой сборке
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+ENCODINGS = [(".gz", _gzip)] + ([(".br", _brotli)] if brotli else [])
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if name.lower().endswith(COMPRESSIBLE):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as stream:
+            data = stream.read()
+        if len(data) < MIN_SIZE:
+            return
+        path = self.path(name)
+        for suffix, compress in ENCODINGS:
+            compressed = compress(data)
+            # копия, которая почти не меньше оригинала, не стоит лишнего stat
+            if len(compressed) < len(data) * 0.95:
+                with open(path + suffix, "wb") as stream:
+                    stream.write(compressed)
+            elif os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    def stored_name(self, name):
+        # файла нет в манифесте (не собран collectstatic): ссылка остаётся
+        # прежней, а не роняет страницу ошибкой шаблона
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
@@ -17,7 +17,7 @@ from django.contrib import admin
 from django.contrib.flatpages import views
 from django.urls import include, path
 from django.conf.urls.static import static
-from . import settings
+from . import metrics, settings
 from django.conf import settings
 from django.conf.urls import handler404, handler500
 
@@ -31,6 +31,10 @@ urlpatterns = [
         # регистрация и авторизация
         path("auth/", include("users.urls")),
         path("auth/", include("django.contrib.auth.urls")),
+        # JSON API для мобильных клиентов
+        path("api/v1/", include("posts.api_urls")),
+        # метрики для Prometheus
+        path("metrics/", metrics.metrics_view, name="metrics"),
         # импорт из приложения posts
         path("", include("posts.urls")),
 ] 